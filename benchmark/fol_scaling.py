@@ -0,0 +1,86 @@
+""" Measures how the runtime of the generalized FOL model (models/polyfol.py)
+grows with the number of terms in premise chains. For small numbers of terms,
+the results are compared to an explicit enumeration of all worlds.
+
+Usage: python fol_scaling.py [max_terms] [n_tasks]
+
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+import polyfol
+
+QUANTIFIERS = ['A', 'I', 'E', 'O']
+
+# explicit enumeration needs 2^(2^N - 1) worlds and is only feasible for few terms
+MAX_ENUMERATION_TERMS = 4
+
+
+def random_chain(n_terms, rng):
+    """ Generates a premise chain t0-t1, t1-t2, ... and a conclusion about t0 and tN. """
+    terms = ['t{}'.format(x) for x in range(n_terms)]
+    premises = []
+    for idx in range(n_terms - 1):
+        subj, obj = terms[idx], terms[idx + 1]
+        if rng.random() < 0.5:
+            subj, obj = obj, subj
+        premises.append((rng.choice(QUANTIFIERS), subj, obj))
+
+    conclusion = (rng.choice(QUANTIFIERS), terms[0], terms[-1])
+    if rng.random() < 0.5:
+        conclusion = (conclusion[0], terms[-1], terms[0])
+    return conclusion, premises
+
+
+def enumerate_conclusion(conclusion, premises):
+    """ Reference implementation checking the conclusion in every world. """
+    terms = sorted(set(x for _, subj, obj in premises for x in (subj, obj)))
+    space = polyfol.RegionSpace(terms)
+    worlds = np.arange(2**(2**len(terms) - 1), dtype=np.int64)
+
+    def holds(needs, forbidden):
+        result = (worlds & forbidden) == 0
+        for need in needs:
+            result &= (worlds & need) != 0
+        return result
+
+    admissible = np.ones(len(worlds), dtype=bool)
+    for premise in premises:
+        needs, forbidden, _, _ = space.statement(*premise)
+        admissible &= holds(needs, forbidden)
+
+    _, _, needs, forbidden = space.statement(*conclusion)
+    concl_holds = holds(needs, forbidden)[admissible]
+    return bool(concl_holds.any()), bool(concl_holds.all())
+
+
+def time_tasks(fn, tasks):
+    start = time.perf_counter()
+    results = [fn(concl, prems) for concl, prems in tasks]
+    return (time.perf_counter() - start) / len(tasks), results
+
+
+if __name__ == "__main__":
+    max_terms = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    n_tasks = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    rng = np.random.default_rng(0)
+
+    print('{:>6} {:>16} {:>16}'.format('terms', 'polyfol [ms]', 'enumerate [ms]'))
+    for n_terms in range(3, max_terms + 1):
+        tasks = [random_chain(n_terms, rng) for _ in range(n_tasks)]
+        poly_time, poly_results = time_tasks(polyfol.evaluate_conclusion, tasks)
+
+        enum_str = '-'
+        if n_terms <= MAX_ENUMERATION_TERMS:
+            enum_tasks = tasks[:max(1, n_tasks // 10)]
+            enum_time, enum_results = time_tasks(enumerate_conclusion, enum_tasks)
+            assert enum_results == poly_results[:len(enum_tasks)], 'Results differ from enumeration'
+            enum_str = '{:.3f}'.format(enum_time * 1000)
+
+        print('{:>6} {:>16.3f} {:>16}'.format(n_terms, poly_time * 1000, enum_str))
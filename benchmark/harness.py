@@ -0,0 +1,478 @@
+""" Standalone coverage evaluation of the models listed in a CCOBRA benchmark
+file. Participants are fitted as in the CCOBRA coverage evaluation (a copy of
+the model is trained on each participant via pre_train_person), but predictions
+are obtained for all tasks of a participant at once if a model provides batch
+prediction functions (e.g., predict_rating_batch for predict_rating). The
+results are written in the format of the CCOBRA result files, which can be used
+with the plotting scripts.
+
+Model entries can be evaluated in parallel and their results can be cached on
+disk (see run). The data can be given in the CSV format or in the columnar format
+(see models/columnar.py), which is loaded without parsing the task strings.
+
+Usage: python harness.py [evaluation.json] [-d data.csv|data.cols] [-s results.csv] [-ml model_log.json]
+                         [-j n_jobs] [-c cache_dir] [--seed seed] [-p profile.json]
+
+"""
+
+import argparse
+import ast
+import copy
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import time
+import zlib
+
+import ccobra
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+import columnar
+import encoding
+import profiling
+
+# Comparators of the CCOBRA benchmark files supported by the harness
+COMPARATORS = {
+    'equality': lambda pred, truth: (pred == truth).astype(int),
+    'absdiff': lambda pred, truth: np.abs(pred.astype(float) - truth.astype(float))
+}
+
+# Data directories (relative to the model directory) used by model modules
+DATA_DEPENDENCIES = {
+    'mreasoner.py': 'caches'
+}
+
+
+class Benchmark():
+    """ Benchmark specification read from a CCOBRA benchmark file. Paths are
+    resolved relative to the benchmark file. The data file can be replaced
+    (e.g., by a dataset created with data/generate.py).
+
+    """
+
+    def __init__(self, path, data_path=None):
+        with open(path) as bench_file:
+            spec = json.load(bench_file)
+
+        if spec.get('type', 'coverage') != 'coverage':
+            raise ValueError("Only coverage benchmarks are supported, got '{}'".format(spec['type']))
+
+        base_dir = os.path.dirname(os.path.abspath(path))
+        self.data_path = data_path or os.path.join(base_dir, spec['data.test'])
+
+        self.models = []
+        for entry in spec['models']:
+            if isinstance(entry, str):
+                entry = {'filename': entry}
+            self.models.append({
+                'path': os.path.join(base_dir, entry['filename']),
+                'name': entry.get('override_name'),
+                'args': entry.get('args', {})
+            })
+
+        # The main evaluation compares the responses, auxiliary evaluations add further columns
+        self.evaluations = [{'data_column': 'response', 'comparator': 'equality', 'prediction_fn_name': 'predict'}]
+        for aux in spec.get('aux_evaluations', []):
+            self.evaluations.append({
+                'data_column': aux['data_column'],
+                'comparator': aux.get('comparator', 'equality'),
+                'prediction_fn_name': aux.get('prediction_fn_name', 'predict'),
+                'task_encoded': 'task_encoders' in aux
+            })
+
+        for evaluation in self.evaluations:
+            if evaluation['comparator'] not in COMPARATORS:
+                raise ValueError("Unsupported comparator '{}'".format(evaluation['comparator']))
+
+
+def load_model_class(path):
+    """ Imports a model file and returns the CCOBRA model class defined in it.
+    The directory of the file is added to the path, so that the flat imports of
+    the models work.
+
+    """
+    model_dir, filename = os.path.split(os.path.abspath(path))
+    if model_dir not in sys.path:
+        sys.path.insert(0, model_dir)
+    module = importlib.import_module(os.path.splitext(filename)[0])
+
+    classes = [
+        x for x in vars(module).values()
+        if isinstance(x, type) and issubclass(x, ccobra.CCobraModel) and x.__module__ == module.__name__
+    ]
+    if len(classes) != 1:
+        raise ValueError("Expected exactly one model class in '{}', found {}".format(path, len(classes)))
+    return classes[0]
+
+
+def prepare_tasks(dataset):
+    """ Encodes the tasks of each participant for the batch prediction functions.
+
+    Parameters
+    ----------
+    dataset : dict
+        Dictionary mapping participant identifiers to lists of task dictionaries.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping participant identifiers to syllogism indices,
+        conclusion indices, and believability flags.
+
+    """
+    result = {}
+    for ident, data in dataset.items():
+        encoded = np.array([encoding.encode_item(x['item']) for x in data], dtype=int).reshape(-1, 2)
+        believable = np.array([x['aux']['is_believable'] for x in data], dtype=bool)
+        result[ident] = (encoded[:, 0], encoded[:, 1], believable)
+    return result
+
+
+def predict_participant(model, fn_name, data, batch):
+    """ Obtains the predictions of a fitted model for all tasks of a participant,
+    using the batch function (fn_name + '_batch') if available. """
+    batch_fn = getattr(model, fn_name + '_batch', None)
+    if batch_fn is not None:
+        return list(batch_fn(*batch))
+
+    pred_fn = getattr(model, fn_name)
+    return [pred_fn(copy.deepcopy(x['item']), **copy.deepcopy(x['aux'])) for x in data]
+
+
+def evaluate_model(model_info, benchmark, dataset, tasks):
+    """ Evaluates a model in coverage mode.
+
+    Returns
+    -------
+    tuple(str, dict, dict, dict)
+        Model name, predictions per evaluation (in participant and task order),
+        model logs per participant, and timings (s).
+
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    pre_model = load_model_class(model_info['path'])(**model_info['args'])
+    pre_model.setup_environment('coverage')
+    name = model_info['name'] or pre_model.name
+    timings['setup'] = time.perf_counter() - start
+
+    predictions = {x['data_column']: [] for x in benchmark.evaluations}
+    model_logs = {}
+    timings['fit'] = timings['predict'] = 0.0
+    for ident, data in dataset.items():
+        start = time.perf_counter()
+        model = copy.deepcopy(pre_model)
+        model.start_participant(id=ident)
+        model.pre_train_person(data)
+        timings['fit'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for evaluation in benchmark.evaluations:
+            predictions[evaluation['data_column']].extend(
+                predict_participant(model, evaluation['prediction_fn_name'], data, tasks[ident]))
+        timings['predict'] += time.perf_counter() - start
+
+        model_log = {}
+        model.end_participant(ident, model_log)
+        if model_log:
+            model_logs[ident] = model_log
+
+    return name, predictions, model_logs, timings
+
+
+def to_string(values):
+    """ Formats values like ccobra.tuple_to_string. """
+    return [ccobra.tuple_to_string(x) for x in values]
+
+
+class Context():
+    """ Data of a benchmark shared by the evaluations of all models. """
+
+    def __init__(self, benchmark):
+        target_columns = [x['data_column'] for x in benchmark.evaluations]
+        if columnar.is_columnar(benchmark.data_path):
+            data = columnar.load(benchmark.data_path)
+            self.dataset = data.to_eval_dict(target_columns)
+            self.tasks = data.tasks()
+        else:
+            data = ccobra.CCobraData(pd.read_csv(benchmark.data_path), target_columns=target_columns)
+            self.dataset = data.to_eval_dict()
+            self.tasks = prepare_tasks(self.dataset)
+
+        # Columns shared by all models
+        all_tasks = [x for data in self.dataset.values() for x in data]
+        items = [x['item'] for x in all_tasks]
+        self.task_enc = [encoding.SYLLOGISMS[x] for ident in self.dataset for x in self.tasks[ident][0]]
+        self.base = {
+            'id': [x.identifier for x in items],
+            'domain': [x.domain for x in items],
+            'response_type': [x.response_type for x in items],
+            'sequence': [x.sequence_number for x in items],
+            'task': [x.task_str for x in items],
+            'choices': [x.choices_str for x in items]
+        }
+        self.truths = {
+            x['data_column']: [task[x['data_column']] for task in all_tasks] for x in benchmark.evaluations
+        }
+
+
+def evaluate_entry(model_info, benchmark, context, seed):
+    """ Evaluates a model entry of the benchmark.
+
+    Returns
+    -------
+    tuple(pd.DataFrame, dict, dict, dict)
+        Results in the format of the CCOBRA result files, model logs per
+        participant, timings (s), and the profiling summary (None if profiling
+        is disabled).
+
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    profiling.reset()
+
+    start = time.perf_counter()
+    name, predictions, logs, timings = evaluate_model(model_info, benchmark, context.dataset, context.tasks)
+
+    columns = dict(context.base)
+    columns['model'] = name
+    for idx, evaluation in enumerate(benchmark.evaluations):
+        column = evaluation['data_column']
+        truths = context.truths[column]
+        scores = COMPARATORS[evaluation['comparator']](np.array(predictions[column]), np.array(truths))
+
+        # Columns of auxiliary evaluations are suffixed by their data column as in CCOBRA
+        suffix = '' if idx == 0 else '_' + column
+        columns['truth' + suffix] = to_string(truths)
+        columns['prediction' + suffix] = to_string(predictions[column])
+        columns['score_' + column] = scores
+        if idx == 0:
+            columns['task_enc'] = np.nan
+            columns['truth_enc_' + column] = np.nan
+            columns['prediction_enc_' + column] = np.nan
+        elif evaluation['task_encoded']:
+            columns['task_enc' + suffix] = context.task_enc
+
+    first = ['model', 'id', 'domain', 'response_type', 'sequence', 'task', 'choices']
+    result_df = pd.DataFrame(columns)
+    result_df = result_df[first + [x for x in result_df.columns if x not in first]]
+
+    timings['total'] = time.perf_counter() - start
+    return result_df, logs, timings, profiling.summary() if profiling.is_enabled() else None
+
+
+def local_dependencies(path):
+    """ Collects the source files a model file depends on by following its
+    imports of modules located next to it (e.g., fol.py or helpers/phm.py).
+
+    Parameters
+    ----------
+    path : str
+        Path to the model file.
+
+    Returns
+    -------
+    list(str)
+        Sorted paths of the model file and its local dependencies.
+
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    result = set()
+    pending = [os.path.abspath(path)]
+    while pending:
+        filename = pending.pop()
+        if filename in result:
+            continue
+        result.add(filename)
+
+        with open(filename) as source_file:
+            tree = ast.parse(source_file.read(), filename)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [x.name for x in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+
+            for name in names:
+                module_path = os.path.join(base_dir, *name.split('.'))
+                for candidate in [module_path + '.py', os.path.join(module_path, '__init__.py')]:
+                    if os.path.isfile(candidate):
+                        pending.append(candidate)
+    return sorted(result)
+
+
+def hash_file(digest, path):
+    # Directories (e.g., columnar datasets) are hashed file by file
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            digest.update(filename.encode())
+            hash_file(digest, os.path.join(path, filename))
+        return
+
+    with open(path, 'rb') as data_file:
+        for chunk in iter(lambda: data_file.read(1 << 20), b''):
+            digest.update(chunk)
+
+
+def entry_key(model_info, benchmark, seed):
+    """ Computes the cache key of a model entry. The key covers everything the
+    results depend on: the harness, the CCOBRA version, the data file, the
+    evaluations, the entry itself, the seed, and the model file together with
+    its local dependencies and their data files (DATA_DEPENDENCIES).
+
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([
+        ccobra.__version__, benchmark.evaluations, model_info['name'], model_info['args'], seed,
+        profiling.is_enabled()
+    ], sort_keys=True).encode())
+
+    hash_file(digest, os.path.abspath(__file__))
+    hash_file(digest, benchmark.data_path)
+
+    base_dir = os.path.dirname(os.path.abspath(model_info['path']))
+    for path in local_dependencies(model_info['path']):
+        digest.update(os.path.relpath(path, base_dir).encode())
+        hash_file(digest, path)
+
+        data_dir = DATA_DEPENDENCIES.get(os.path.relpath(path, base_dir))
+        if data_dir is not None and os.path.isdir(os.path.join(base_dir, data_dir)):
+            for filename in sorted(os.listdir(os.path.join(base_dir, data_dir))):
+                digest.update(os.path.join(data_dir, filename).encode())
+                hash_file(digest, os.path.join(base_dir, data_dir, filename))
+    return digest.hexdigest()
+
+
+def entry_seed(model_info, seed):
+    """ Derives the seed of a model entry from the seed of the run, so that the
+    results of an entry do not depend on its position or the worker process. """
+    entry = json.dumps([model_info['name'], os.path.basename(model_info['path']), model_info['args']], sort_keys=True)
+    return int(np.random.SeedSequence([seed, zlib.crc32(entry.encode())]).generate_state(1)[0])
+
+
+# Benchmark and data evaluated by the current worker process, see init_worker
+_worker_benchmark = None
+_worker_context = None
+
+def init_worker(benchmark):
+    global _worker_benchmark, _worker_context
+    _worker_benchmark = benchmark
+    _worker_context = Context(benchmark)
+
+
+def _evaluate_job(job):
+    model_info, seed = job
+    return evaluate_entry(model_info, _worker_benchmark, _worker_context, seed)
+
+
+def run(benchmark, n_jobs=1, cache_dir=None, seed=0):
+    """ Evaluates all models of a benchmark. Entries are distributed over a
+    process pool and their results are cached on disk, so that only entries
+    whose files, arguments, or data changed are evaluated again. Merged results
+    are identical to a sequential evaluation without cache.
+
+    Parameters
+    ----------
+    benchmark : Benchmark
+        Benchmark to evaluate.
+
+    n_jobs : int, optional
+        Number of worker processes. None uses all CPUs, 1 evaluates all entries
+        in the current process.
+
+    cache_dir : str, optional
+        Directory of the result cache. If not given, no results are cached.
+
+    seed : int
+        Seed of the run, see entry_seed.
+
+    Returns
+    -------
+    tuple(pd.DataFrame, dict, pd.DataFrame, dict)
+        Results in the format of the CCOBRA result files, model logs per model
+        and participant, timings per model, and profiling summaries per model
+        (empty if profiling is disabled, see profiling.py).
+
+    """
+    keys = [entry_key(x, benchmark, seed) for x in benchmark.models]
+    results = [None] * len(benchmark.models)
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        for idx, key in enumerate(keys):
+            cache_path = os.path.join(cache_dir, key + '.pkl')
+            if os.path.isfile(cache_path):
+                with open(cache_path, 'rb') as cache_file:
+                    results[idx] = pickle.load(cache_file)
+
+    pending = [idx for idx, x in enumerate(results) if x is None]
+    jobs = [(benchmark.models[idx], entry_seed(benchmark.models[idx], seed)) for idx in pending]
+    if n_jobs == 1 or len(jobs) <= 1:
+        context = Context(benchmark) if jobs else None
+        computed = [evaluate_entry(model_info, benchmark, context, entry) for model_info, entry in jobs]
+    else:
+        with multiprocessing.Pool(min(n_jobs or os.cpu_count(), len(jobs)), initializer=init_worker,
+                                  initargs=(benchmark,)) as pool:
+            computed = pool.map(_evaluate_job, jobs, chunksize=1)
+
+    for idx, result in zip(pending, computed):
+        results[idx] = result
+        if cache_dir is not None:
+            with open(os.path.join(cache_dir, keys[idx] + '.pkl'), 'wb') as cache_file:
+                pickle.dump(result, cache_file)
+
+    model_logs = {}
+    timings = []
+    profiles = {}
+    for idx, (result_df, logs, entry_timings, profile) in enumerate(results):
+        name = result_df['model'].iloc[0] if len(result_df) else benchmark.models[idx]['name']
+        if logs:
+            model_logs[name] = logs
+        if profile is not None:
+            profiles[name] = profile
+        timings.append(dict(model=name, cached=idx not in pending, **entry_timings))
+
+    result_df = pd.concat([x[0] for x in results], ignore_index=True)
+    return result_df, model_logs, pd.DataFrame(timings), profiles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Standalone coverage evaluation of a CCOBRA benchmark file.')
+    parser.add_argument('benchmark', nargs='?', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'evaluation.json'), help='Path to the benchmark file.')
+    parser.add_argument('-d', '--data', help='Data file (csv or columnar directory, see models/columnar.py) replacing data.test of the benchmark file.')
+    parser.add_argument('-s', '--save', default='results.csv', help='Path of the results file (csv).')
+    parser.add_argument('-ml', '--modellog', help='Path of the model log file (json).')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes (0 uses all CPUs).')
+    parser.add_argument('-c', '--cache', help='Directory of the result cache.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the run.')
+    parser.add_argument('-p', '--profile', help='Enables profiling and saves the summary (json or csv).')
+    args = parser.parse_args()
+
+    if args.profile:
+        profiling.enable()
+
+    start = time.perf_counter()
+    result_df, model_logs, timings, profiles = run(
+        Benchmark(args.benchmark, args.data), n_jobs=args.jobs or None, cache_dir=args.cache, seed=args.seed)
+    result_df.to_csv(args.save, index=False)
+
+    if args.modellog:
+        with open(args.modellog, 'w') as log_file:
+            json.dump(model_logs, log_file)
+
+    if args.profile:
+        profiling.write_summaries(args.profile, profiles)
+
+    print(timings.to_string(index=False, float_format='{:.3f}'.format))
+    print('Total: {:.2f}s'.format(time.perf_counter() - start))
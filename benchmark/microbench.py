@@ -0,0 +1,233 @@
+""" Micro-benchmarks of the fitting and prediction hot paths of the models. The
+benchmarks run on the Trippas-2018 data (if data/Trippas2018.csv exists) and on
+synthetic data scaled to multiples of its size. Results are stored as JSON and
+can be compared against a saved baseline, in which case benchmarks that got
+slower than the tolerance are reported as regressions.
+
+Usage: python microbench.py [-o results.json] [-b baseline.json] [-d data.csv ...] [--scales 1 10]
+                            [--tolerance 0.2] [--repeat 5]
+
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+
+import ccobra
+import numpy as np
+import pandas as pd
+from ccobra.syllogistic import syllogism
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+import columnar
+import counts
+import encoding
+import fol
+import registry
+import portfolio
+import SelectiveScrutinyModel as ss
+import MisinterpretedNecessity as mn
+import NoBeliefModel as nobel
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'Trippas2018.csv')
+
+# Size of the synthetic data at scale 1 (roughly the size of the Trippas-2018 data)
+SYNTHETIC_PARTICIPANTS = 100
+SYNTHETIC_TASKS = 64
+
+BELIEF_MODELS = {
+    'NoBelief': nobel.NoBeliefModel,
+    'MN': mn.MisinterpretedNecessityRestr,
+    'SS': ss.SelectiveScrutinyRestr
+}
+
+
+def synthetic_data(n_participants, n_tasks, seed=0):
+    """ Generates random verification tasks in the format of data/Trippas2018.csv. """
+    rng = np.random.default_rng(seed)
+    n_rows = n_participants * n_tasks
+    syls = rng.choice(encoding.SYLLOGISMS, n_rows)
+    concls = rng.choice(encoding.RESPONSES[:-1], n_rows)
+    ratings = rng.integers(1, 7, n_rows)
+
+    return pd.DataFrame({
+        'id': np.repeat(np.arange(1, n_participants + 1), n_tasks),
+        'sequence': np.tile(np.arange(n_tasks), n_participants),
+        'task': [syllogism.create_data_string_task('A', 'B', 'C', x) for x in syls],
+        'choices': [syllogism.create_data_string_response('A', 'C', x) for x in concls],
+        'response': ratings > 3,
+        'domain': 'syllogistic-belief',
+        'response_type': 'verify',
+        'rating': ratings,
+        'enc_task': syls,
+        'enc_resp': concls,
+        'is_believable': rng.random(n_rows) < 0.5
+    })
+
+
+def load_datasets(scales, paths=()):
+    """ Returns the datasets to benchmark as dictionaries mapping participant
+    identifiers to lists of task dictionaries. Additional datasets (e.g.,
+    created with data/generate.py, in the CSV or columnar format) are named by
+    their file names. """
+    frames = {}
+    if os.path.isfile(DATA_PATH):
+        frames['trippas'] = pd.read_csv(DATA_PATH)
+    for path in paths:
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        frames[name] = columnar.load(path).to_frame() if columnar.is_columnar(path) else pd.read_csv(path)
+    for scale in scales:
+        frames['synthetic-x{}'.format(scale)] = synthetic_data(SYNTHETIC_PARTICIPANTS * scale, SYNTHETIC_TASKS)
+
+    return {
+        name: ccobra.CCobraData(df, target_columns=['response', 'rating']).to_eval_dict()
+        for name, df in frames.items()
+    }
+
+
+def measure(func, repeat, number=1, setup=None):
+    """ Measures the time per call of a function.
+
+    Parameters
+    ----------
+    func : callable
+        Function to measure. Receives the result of setup if given.
+
+    repeat : int
+        Number of measurements.
+
+    number : int
+        Number of calls per measurement.
+
+    setup : callable, optional
+        Function called before each measurement (not timed).
+
+    Returns
+    -------
+    dict
+        Minimum and median time per call (s), and the number of measurements
+        and calls per measurement.
+
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        for _ in range(number):
+            func(arg) if setup is not None else func()
+        times.append((time.perf_counter() - start) / number)
+    return {'min': min(times), 'median': float(np.median(times)), 'repeat': repeat, 'number': number}
+
+
+def fol_benchmarks(repeat):
+    results = {}
+
+    def cold_setup():
+        fol._verdict_table = None
+    results['fol.evaluate_conclusion.cold'] = measure(
+        lambda _: fol.FOL().evaluate_conclusion('Aac', 'AA1'), repeat, setup=cold_setup)
+
+    model = fol.FOL()
+    pairs = [(concl, syl) for syl in encoding.SYLLOGISMS for concl in encoding.RESPONSES]
+    results['fol.evaluate_conclusion.warm'] = measure(
+        lambda: [model.evaluate_conclusion(*x) for x in pairs], repeat)
+    results['fol.evaluate_conclusion.warm']['per'] = 'all 576 conclusions'
+
+    results['fol.create_world_set'] = measure(
+        lambda: [fol.create_world_set(x) for x in encoding.SYLLOGISMS], repeat)
+    results['fol.create_world_set']['per'] = 'all 64 syllogisms'
+    return results
+
+
+def data_benchmarks(dataset, repeat):
+    results = {}
+    participants = list(dataset.values())
+    responses, _ = counts.from_dataset(participants)
+    train_counts = responses.sum(axis=2)
+
+    for method in ['mReasoner', 'phm']:
+        model = registry.create(method)
+        results['{}.fit'.format(method)] = measure(lambda: model.fit(train_counts), repeat)
+
+    first = participants[0]
+    for name, cls in BELIEF_MODELS.items():
+        for method in ['mReasoner', 'fol', 'phm']:
+            model = cls(method=method)
+            key = '{}-{}'.format(name, method)
+            results[key + '.pre_train'] = measure(lambda: model.pre_train(participants), repeat)
+            results[key + '.predict_rating'] = measure(
+                lambda: [model.predict_rating(x['item'], **x['aux']) for x in first], repeat)
+            results[key + '.predict_rating']['per'] = '{} tasks'.format(len(first))
+
+    model = portfolio.Portfolio()
+    results['Portfolio.pre_train_person'] = measure(
+        lambda pair: pair[0].pre_train_person(pair[1]), repeat,
+        setup=lambda: (copy.deepcopy(model), first))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """ Compares median times to a baseline.
+
+    Returns
+    -------
+    list(str)
+        Names of the benchmarks slower than the baseline by more than the
+        tolerance (relative).
+
+    """
+    regressions = []
+    print('{:<48} {:>12} {:>12} {:>8}'.format('benchmark', 'base [ms]', 'now [ms]', 'ratio'))
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            print('{:<48} {:>12} {:>12.3f} {:>8}'.format(name, '-', result['median'] * 1000, 'new'))
+            continue
+        ratio = result['median'] / baseline[name]['median']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{:<48} {:>12.3f} {:>12.3f} {:>8.2f}{}'.format(
+            name, baseline[name]['median'] * 1000, result['median'] * 1000, ratio, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the model hot paths.')
+    parser.add_argument('-o', '--output', default='microbench.json', help='Path of the results file (json).')
+    parser.add_argument('-b', '--baseline', help='Results file (json) to compare against.')
+    parser.add_argument('-d', '--data', nargs='*', default=[], help='Additional data files to benchmark on.')
+    parser.add_argument('--scales', type=int, nargs='*', default=[1, 10], help='Scales of the synthetic data.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Relative slowdown reported as regression.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measurements per benchmark.')
+    args = parser.parse_args()
+
+    results = fol_benchmarks(args.repeat)
+    for data_name, dataset in load_datasets(args.scales, args.data).items():
+        for name, result in data_benchmarks(dataset, args.repeat).items():
+            results['{}/{}'.format(data_name, name)] = result
+
+    with open(args.output, 'w') as out_file:
+        json.dump({
+            'meta': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+            },
+            'results': results
+        }, out_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as base_file:
+            regressions = compare(results, json.load(base_file)['results'], args.tolerance)
+        if regressions:
+            print('{} regression(s)'.format(len(regressions)))
+            sys.exit(1)
+    else:
+        for name, result in sorted(results.items()):
+            print('{:<48} {:>12.3f} ms'.format(name, result['median'] * 1000))
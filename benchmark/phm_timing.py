@@ -0,0 +1,40 @@
+""" Compares the fitting time of PHM (6 confidence settings) and ContinuousPHM
+(dense confidence grid) on random count tensors.
+
+Usage: python phm_timing.py [n_fits] [step]
+
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+import phm
+
+
+def time_fits(model, train_counts):
+    start = time.perf_counter()
+    for counts in train_counts:
+        model.fit(counts)
+    return (time.perf_counter() - start) / len(train_counts)
+
+
+if __name__ == "__main__":
+    n_fits = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    step = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    rng = np.random.default_rng(0)
+    train_counts = rng.integers(0, 3, size=(n_fits, 64, 9, 2))
+
+    start = time.perf_counter()
+    continuous = phm.ContinuousPHM(step=step)
+    setup_time = time.perf_counter() - start
+
+    print('Grid with step {}: {} confidence vectors, {} decision classes (setup {:.2f}ms)'.format(
+        step, continuous.class_sizes.sum(), len(continuous.decisions), setup_time * 1000))
+    print('{:<16} {:>12}'.format('model', 'fit [ms]'))
+    for name, model in [('PHM', phm.PHM()), ('ContinuousPHM', continuous)]:
+        print('{:<16} {:>12.3f}'.format(name, time_fits(model, train_counts) * 1000))
@@ -1,112 +1,108 @@
+""" Converts the raw Trippas-2018 data (raw_Trippas2018/trippas_drh_syll.txt) into
+the CCOBRA datasets Trippas2018.csv (verification) and Trippas2018-rating.csv
+(ratings), and into the columnar version Trippas2018.cols of the verification
+dataset (see models/columnar.py). The raw file is processed in chunks, so that
+memory usage does not depend on its size.
+
+Usage: python extract.py [raw_file] [chunk_size]
+
+"""
+
+import os.path
+import sys
+
 import pandas as pd
 import numpy as np
 import ccobra
-import os.path
 
-# Check if Trippas dataset exists
-if not os.path.isfile('raw_Trippas2018/trippas_drh_syll.txt'):
-    print("Please download the Trippas-2018 dataset 'trippas_drh_syll.txt' from https://osf.io/kt3jn/ and copy it into the Trippas2018 subfolder")
-    exit()
-
-# Load the raw data
-df = pd.read_csv('raw_Trippas2018/trippas_drh_syll.txt', sep='\t')
-
-# Normalize dataset
-df['enc_task'] = df['syllc'].apply(lambda x: x[:3].upper())
-
-def extract_enc_resp(x):
-    x = x[-2:]
-    enc_resp = x[0].upper() + ('ac' if int(x[-1]) == 1 else 'ca')
-    assert enc_resp in ccobra.syllogistic.RESPONSES
-    return enc_resp
-
-df['enc_resp'] = df['syllc'].apply(extract_enc_resp)
-df['response'] = df['rsp'].apply(lambda x: x == 1)
-df['is_believable'] = df['bel'].apply(lambda x: x == 'believable')
-df['is_valid'] = df['val'].apply(lambda x: x == 'valid')
-
-# Remove uninteresting columns
-df = df.drop(columns=[
-    'syllc',
-    'val',
-    'bel',
-    'rsp',
-])
-
-df = df.rename(columns={
-    'sub': 'id',
-    'cond': 'experiment_id',
-    'conddesc': 'experiment_description',
-})
-
-# Add sequence column
-seq_nos = []
-cur_nos = {}
-for row_idx, row in df.iterrows():
-    cur_token = (row['id'], row['experiment_id'])
-    if cur_token not in cur_nos:
-        cur_nos[cur_token] = 0
-
-    seq_nos.append(cur_nos[cur_token])
-    cur_nos[cur_token] += 1
-
-df['sequence'] = seq_nos
-
-# Add task
-def construct_task(enc_task):
-    quant1 = enc_task[0].replace('A', 'All').replace('I', 'Some').replace('E', 'No').replace('O', 'Some not')
-    quant2 = enc_task[1].replace('A', 'All').replace('I', 'Some').replace('E', 'No').replace('O', 'Some not')
-
-    if int(enc_task[-1]) == 1:
-        return '{};A;B/{};B;C'.format(quant1, quant2)
-    elif int(enc_task[-1]) == 2:
-        return '{};B;A/{};C;B'.format(quant1, quant2)
-    elif int(enc_task[-1]) == 3:
-        return '{};A;B/{};C;B'.format(quant1, quant2)
-    elif int(enc_task[-1]) == 4:
-        return '{};B;A/{};B;C'.format(quant1, quant2)
-
-df['task'] = df['enc_task'].apply(construct_task)
-
-def construct_choice(enc_resp):
-    quant = enc_resp[0].replace('A', 'All').replace('I', 'Some').replace('E', 'No').replace('O', 'Some not')
-
-    if enc_resp[1:] == 'ac':
-        return '{};A;C'.format(quant)
-    else:
-        return '{};C;A'.format(quant)
-
-df['choices'] = df['enc_resp'].apply(construct_choice)
-df['domain'] = 'syllogistic-belief'
-df['response_type'] = 'verify'
-
-# Sort columns
-df = df[[
-    'id',
-    'sequence',
-    'task',
-    'choices',
-    'response',
-    'domain',
-    'response_type',
-    'rating',
-    'experiment_id',
-    'experiment_description',
-    'enc_task',
-    'enc_resp',
-    'is_believable',
-    'is_valid',
-]]
-
-print(df.head())
-df.to_csv('Trippas2018.csv', index=False)
-
-# Store rating variant of the dataset
-df = df.drop(columns=['response'])
-df = df.rename(columns={'rating': 'response'})
-df['response_type'] = 'single-choice'
-df['task'] = df[['task', 'choices']].apply(lambda x: x[0] + '|' + x[1], axis=1)
-df['choices'] = '1|2|3|4|5|6'
-
-print(df.head())
-df.to_csv('Trippas2018-rating.csv', index=False)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+import columnar
+
+RAW_PATH = 'raw_Trippas2018/trippas_drh_syll.txt'
+CHUNK_SIZE = 100000
+
+COLUMNS = columnar.CSV_COLUMNS
+
+def normalize(df, seq_counts):
+    """ Converts a chunk of the raw data into the CCOBRA format.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Chunk of the raw data.
+
+    seq_counts : pd.Series
+        Number of tasks per (id, experiment_id) in the previous chunks. Updated
+        with the tasks of this chunk.
+
+    Returns
+    -------
+    tuple(pd.DataFrame, pd.Series)
+        Chunk in the CCOBRA format and the updated task counts.
+
+    """
+    df = df.rename(columns={
+        'sub': 'id',
+        'cond': 'experiment_id',
+        'conddesc': 'experiment_description',
+    })
+
+    syllc = df['syllc'].astype(str)
+    df['enc_task'] = syllc.str[:3].str.upper()
+    df['enc_resp'] = syllc.str[-2].str.upper() + np.where(syllc.str[-1] == '1', 'ac', 'ca')
+    assert df['enc_resp'].isin(ccobra.syllogistic.RESPONSES).all()
+
+    df['response'] = df['rsp'] == 1
+    df['is_believable'] = df['bel'] == 'believable'
+    df['is_valid'] = df['val'] == 'valid'
+
+    # Sequence numbers continue the counts of the previous chunks
+    groups = pd.MultiIndex.from_frame(df[['id', 'experiment_id']])
+    offsets = seq_counts.reindex(groups, fill_value=0).to_numpy()
+    df['sequence'] = df.groupby(['id', 'experiment_id'], sort=False).cumcount().to_numpy() + offsets
+    seq_counts = seq_counts.add(df.groupby(['id', 'experiment_id']).size(), fill_value=0).astype(int)
+
+    df['task'] = df['enc_task'].map(columnar.TASKS)
+    df['choices'] = df['enc_resp'].map(columnar.CHOICES)
+    df['domain'] = 'syllogistic-belief'
+    df['response_type'] = 'verify'
+
+    return df[COLUMNS], seq_counts
+
+def to_rating(df):
+    """ Converts a chunk of the verification dataset into the rating variant. """
+    df = df.drop(columns=['response'])
+    df = df.rename(columns={'rating': 'response'})
+    df['response_type'] = 'single-choice'
+    df['task'] = df['task'] + '|' + df['choices']
+    df['choices'] = '1|2|3|4|5|6'
+    return df
+
+def extract(raw_path, chunk_size=CHUNK_SIZE):
+    seq_counts = pd.Series(dtype=int, index=pd.MultiIndex.from_arrays([[], []], names=['id', 'experiment_id']))
+
+    for idx, chunk in enumerate(pd.read_csv(raw_path, sep='\t', chunksize=chunk_size)):
+        df, seq_counts = normalize(chunk, seq_counts)
+        rating_df = to_rating(df)
+
+        if idx == 0:
+            print(df.head())
+            print(rating_df.head())
+
+        df.to_csv('Trippas2018.csv', mode='w' if idx == 0 else 'a', header=idx == 0, index=False)
+        rating_df.to_csv('Trippas2018-rating.csv', mode='w' if idx == 0 else 'a', header=idx == 0, index=False)
+        if idx == 0:
+            columnar.write('Trippas2018.cols', df)
+        else:
+            columnar.append('Trippas2018.cols', df)
+
+if __name__ == "__main__":
+    raw_path = sys.argv[1] if len(sys.argv) > 1 else RAW_PATH
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else CHUNK_SIZE
+
+    # Check if Trippas dataset exists
+    if not os.path.isfile(raw_path):
+        print("Please download the Trippas-2018 dataset 'trippas_drh_syll.txt' from https://osf.io/kt3jn/ and copy it into the Trippas2018 subfolder")
+        exit()
+
+    extract(raw_path, chunk_size)
@@ -0,0 +1,233 @@
+""" Generates synthetic CCOBRA datasets in the format of Trippas2018.csv (see
+extract.py) for scaling tests. Each participant is simulated by a syllogistic
+model (FOL, PHM or mReasoner with random parameters) combined with a belief
+model (NoBelief, MN or SS), whose rating for a task is reported. With a
+configurable probability, a uniformly random rating is reported instead. The
+response is the rating dichotomized at 3.
+
+Participants are generated and written in chunks, so that memory usage does not
+depend on the number of participants.
+
+Usage: python generate.py output.csv [-n n_participants] [--tasks n_tasks]
+                          [--syl-models fol:1,mReasoner:1,phm:1]
+                          [--belief-models nobel:1,mn:1,ss:1]
+                          [--noise 0.2] [--chunk-size 10000] [--seed 0]
+
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+import encoding
+import mreasoner
+import phm
+import registry
+import SelectiveScrutinyModel as ss
+import MisinterpretedNecessity as mn
+import NoBeliefModel as nobel
+
+# Column order of extract.py
+COLUMNS = [
+    'id',
+    'sequence',
+    'task',
+    'choices',
+    'response',
+    'domain',
+    'response_type',
+    'rating',
+    'experiment_id',
+    'experiment_description',
+    'enc_task',
+    'enc_resp',
+    'is_believable',
+    'is_valid',
+]
+
+SYL_MODELS = ['fol', 'mReasoner', 'phm']
+BELIEF_MODELS = {
+    'nobel': nobel.NoBeliefModel.RATINGS,
+    'mn': mn.MisinterpretedNecessityRestr.RATINGS,
+    'ss': ss.SelectiveScrutinyRestr.RATINGS
+}
+
+QUANTIFIERS = {'A': 'All', 'I': 'Some', 'E': 'No', 'O': 'Some not'}
+FIGURES = {'1': '{};A;B/{};B;C', '2': '{};B;A/{};C;B', '3': '{};A;B/{};C;B', '4': '{};B;A/{};B;C'}
+
+
+def construct_task(enc_task):
+    return FIGURES[enc_task[-1]].format(QUANTIFIERS[enc_task[0]], QUANTIFIERS[enc_task[1]])
+
+
+def construct_choice(enc_resp):
+    if enc_resp[1:] == 'ac':
+        return '{};A;C'.format(QUANTIFIERS[enc_resp[0]])
+    return '{};C;A'.format(QUANTIFIERS[enc_resp[0]])
+
+
+def parse_weights(spec, names):
+    """ Parses a weight specification (e.g., 'fol:1,phm:2') into probabilities
+    over the given names. """
+    weights = dict.fromkeys(names, 0.0)
+    for part in spec.split(','):
+        name, weight = part.split(':')
+        if name not in weights:
+            raise ValueError("Unknown model '{}'. Available: {}".format(name, list(names)))
+        weights[name] = float(weight)
+
+    probs = np.array([weights[x] for x in names])
+    if probs.sum() <= 0:
+        raise ValueError("Weights must not all be zero: '{}'".format(spec))
+    return probs / probs.sum()
+
+
+class Generator():
+    """ Simulates participants with the syllogistic and belief models.
+
+    Parameters
+    ----------
+    n_tasks : int
+        Number of tasks per participant.
+
+    syl_probs : np.ndarray
+        Probabilities of the syllogistic models (SYL_MODELS order).
+
+    belief_probs : np.ndarray
+        Probabilities of the belief models (BELIEF_MODELS order).
+
+    noise : float
+        Probability of reporting a uniformly random rating.
+
+    seed : int
+        Seed of the random generator.
+
+    """
+
+    def __init__(self, n_tasks=64, syl_probs=None, belief_probs=None, noise=0.2, seed=0):
+        self.n_tasks = n_tasks
+        self.syl_probs = syl_probs if syl_probs is not None else np.full(len(SYL_MODELS), 1 / len(SYL_MODELS))
+        self.belief_probs = belief_probs if belief_probs is not None else \
+            np.full(len(BELIEF_MODELS), 1 / len(BELIEF_MODELS))
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+        # Ratings indexed by belief model, possible, necessary and believability
+        self.ratings = np.array(list(BELIEF_MODELS.values()))
+
+        # (possible, necessary) tables of FOL and all PHM parameters
+        self.fol_table = np.array(registry.create('fol').evaluate_all())
+        phm_model = registry.create('phm')
+        self.phm_tables = np.zeros((len(phm.P_ENTAILMENT_GRID), len(phm.MAX_CONFIDENCE_GRID), 2, 64, 9), dtype=bool)
+        for idx_p_ent in range(len(phm.P_ENTAILMENT_GRID)):
+            for idx_conf in range(len(phm.MAX_CONFIDENCE_GRID)):
+                phm_model.set_parameters(idx_p_ent, idx_conf)
+                self.phm_tables[idx_p_ent, idx_conf] = phm_model.evaluate_all()
+
+        # mReasoner predictions are looked up in the shared caches per task
+        self.mreasoner = registry.create('mReasoner')
+        self.mreasoner_shape = self.mreasoner.cache_necessary.shape[:-2]
+
+        self.task_strings = np.array([construct_task(x) for x in encoding.SYLLOGISMS], dtype=object)
+        self.choice_strings = np.array([construct_choice(x) for x in encoding.RESPONSES[:-1]], dtype=object)
+
+    def mreasoner_verdicts(self, params, idx_syl, idx_concl):
+        """ Looks up (possible, necessary) for tasks given mReasoner parameter
+        indices of shape (4, n). """
+        index = tuple(params) + (idx_syl,)
+        possible = mreasoner.threshold(self.mreasoner.cache_possible[index], self.mreasoner.packed)
+        necessary = mreasoner.threshold(self.mreasoner.cache_necessary[index], self.mreasoner.packed)
+        rows = np.arange(len(idx_syl))
+        return possible[rows, idx_concl], necessary[rows, idx_concl]
+
+    def generate(self, first_id, n_participants):
+        """ Simulates participants first_id, ..., first_id + n_participants - 1.
+
+        Returns
+        -------
+        pd.DataFrame
+            Tasks in the format of Trippas2018.csv.
+
+        """
+        n_rows = n_participants * self.n_tasks
+        rng = self.rng
+
+        # Participant profiles, repeated for each task
+        syl_model = np.repeat(rng.choice(len(SYL_MODELS), n_participants, p=self.syl_probs), self.n_tasks)
+        belief_model = np.repeat(rng.choice(len(BELIEF_MODELS), n_participants, p=self.belief_probs), self.n_tasks)
+        phm_params = np.repeat(np.stack([
+            rng.integers(0, len(phm.P_ENTAILMENT_GRID), n_participants),
+            rng.integers(0, len(phm.MAX_CONFIDENCE_GRID), n_participants)]), self.n_tasks, axis=1)
+        mreasoner_params = np.repeat(np.stack([
+            rng.integers(0, x, n_participants) for x in self.mreasoner_shape]), self.n_tasks, axis=1)
+
+        # Tasks (conclusions without NVC)
+        idx_syl = rng.integers(0, len(encoding.SYLLOGISMS), n_rows)
+        idx_concl = rng.integers(0, len(encoding.RESPONSES) - 1, n_rows)
+        believable = rng.random(n_rows) < 0.5
+
+        verdicts = np.zeros((2, n_rows), dtype=bool)
+        is_fol = syl_model == SYL_MODELS.index('fol')
+        verdicts[:, is_fol] = self.fol_table[:, idx_syl[is_fol], idx_concl[is_fol]]
+        is_phm = syl_model == SYL_MODELS.index('phm')
+        verdicts[:, is_phm] = self.phm_tables[
+            phm_params[0, is_phm], phm_params[1, is_phm], :, idx_syl[is_phm], idx_concl[is_phm]].T
+        is_mreasoner = syl_model == SYL_MODELS.index('mReasoner')
+        verdicts[:, is_mreasoner] = self.mreasoner_verdicts(
+            mreasoner_params[:, is_mreasoner], idx_syl[is_mreasoner], idx_concl[is_mreasoner])
+
+        rating = self.ratings[belief_model, verdicts[0].astype(int), verdicts[1].astype(int), believable.astype(int)]
+        is_noise = (rng.random(n_rows) < self.noise) | (rating == 0)
+        rating[is_noise] = rng.integers(1, 7, is_noise.sum())
+
+        syllogisms = np.array(encoding.SYLLOGISMS, dtype=object)
+        responses = np.array(encoding.RESPONSES, dtype=object)
+        return pd.DataFrame({
+            'id': np.repeat(np.arange(first_id, first_id + n_participants), self.n_tasks),
+            'sequence': np.tile(np.arange(self.n_tasks), n_participants),
+            'task': self.task_strings[idx_syl],
+            'choices': self.choice_strings[idx_concl],
+            'response': rating > 3,
+            'domain': 'syllogistic-belief',
+            'response_type': 'verify',
+            'rating': rating,
+            'experiment_id': 1,
+            'experiment_description': 'synthetic',
+            'enc_task': syllogisms[idx_syl],
+            'enc_resp': responses[idx_concl],
+            'is_believable': believable,
+            'is_valid': self.fol_table[1, idx_syl, idx_concl]
+        }, columns=COLUMNS)
+
+    def write(self, path, n_participants, chunk_size=10000):
+        """ Writes a dataset of n_participants participants to a csv-file in
+        chunks of chunk_size participants. """
+        for first in range(0, n_participants, chunk_size):
+            chunk = self.generate(first + 1, min(chunk_size, n_participants - first))
+            chunk.to_csv(path, mode='w' if first == 0 else 'a', header=first == 0, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generates synthetic datasets in the format of Trippas2018.csv.')
+    parser.add_argument('output', help='Path of the csv-file.')
+    parser.add_argument('-n', '--participants', type=int, default=1000, help='Number of participants.')
+    parser.add_argument('--tasks', type=int, default=64, help='Number of tasks per participant.')
+    parser.add_argument('--syl-models', default='fol:1,mReasoner:1,phm:1',
+                        help='Weights of the syllogistic models.')
+    parser.add_argument('--belief-models', default='nobel:1,mn:1,ss:1', help='Weights of the belief models.')
+    parser.add_argument('--noise', type=float, default=0.2, help='Probability of a random rating.')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Participants generated at once.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator.')
+    args = parser.parse_args()
+
+    generator = Generator(
+        n_tasks=args.tasks,
+        syl_probs=parse_weights(args.syl_models, SYL_MODELS),
+        belief_probs=parse_weights(args.belief_models, list(BELIEF_MODELS)),
+        noise=args.noise,
+        seed=args.seed)
+    generator.write(args.output, args.participants, args.chunk_size)
@@ -0,0 +1,299 @@
+""" Incremental ingestion of raw belief-bias datasets from several sources into
+the CCOBRA datasets (verification and rating CSV files and the columnar version,
+see extract.py).
+
+Each source defines where its raw files are found and how their columns map to
+the columns of the raw Trippas-2018 data (see SOURCES). A manifest next to the
+outputs records the content hash of each ingested file (and of its source
+definition) together with the position of its rows in the outputs. On each run,
+only new or changed files are processed: the rows of new files are appended to
+the outputs, while changed or removed files truncate the outputs to the rows
+before them, so that they and all files ingested after them are processed
+again. Sources are processed in parallel; their rows are appended in the order
+of the sources and file names (after the rows of the files ingested before).
+
+Sequence numbers continue across the files of a source (as across the chunks of
+a file in extract.py).
+
+Usage: python ingest.py [-s sources.json] [-o Trippas2018] [-j n_jobs]
+                        [--chunk-size 100000] [--rebuild]
+
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+
+import extract
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+import columnar
+
+MANIFEST_VERSION = 1
+
+# Sources of raw data. Each source specifies
+# - pattern: glob pattern of the raw files,
+# - sep: separator of the raw files,
+# - columns: mapping from the columns of the raw Trippas-2018 data (see extract.py)
+#   to the columns of the source,
+# - values (optional): mapping from the columns of the raw Trippas-2018 data to
+#   dictionaries translating the values of the source (given as strings),
+# - constants (optional): values of columns the source does not contain,
+# - id_prefix (optional): prefix making participant identifiers unique across
+#   sources.
+SOURCES = {
+    'Trippas2018': {
+        'pattern': 'raw_Trippas2018/*.txt',
+        'sep': '\t',
+        'columns': {
+            'sub': 'sub',
+            'cond': 'cond',
+            'conddesc': 'conddesc',
+            'syllc': 'syllc',
+            'val': 'val',
+            'bel': 'bel',
+            'rsp': 'rsp',
+            'rating': 'rating',
+        }
+    }
+}
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as raw_file:
+        for chunk in iter(lambda: raw_file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_source(source):
+    """ Hashes the definition of a source, so that changing it reprocesses its files. """
+    return hashlib.sha256(json.dumps(source, sort_keys=True).encode()).hexdigest()
+
+def output_paths(output):
+    return {
+        'csv': output + '.csv',
+        'rating': output + '-rating.csv',
+        'columnar': output + '.cols',
+        'manifest': output + '.manifest.json',
+    }
+
+def to_raw(df, source):
+    """ Converts a chunk of a source into the columns of the raw Trippas-2018 data. """
+    raw = pd.DataFrame({target: df[column] for target, column in source['columns'].items()})
+    for column, value in source.get('constants', {}).items():
+        raw[column] = value
+    for column, translation in source.get('values', {}).items():
+        raw[column] = raw[column].map(lambda x: translation.get(str(x), x))
+    if 'id_prefix' in source:
+        raw['sub'] = source['id_prefix'] + raw['sub'].astype(str)
+    return raw
+
+def counts_to_list(seq_counts):
+    return [[ident, exp, int(n)] for (ident, exp), n in zip(seq_counts.index.tolist(), seq_counts.tolist()) if n]
+
+def counts_from_list(entries):
+    """ Sums the task counts per (id, experiment_id) recorded for the files of a source. """
+    index = pd.MultiIndex.from_arrays([[], []], names=['id', 'experiment_id'])
+    if not entries:
+        return pd.Series(dtype=int, index=index)
+    df = pd.DataFrame(entries, columns=['id', 'experiment_id', 'n'])
+    return df.groupby(['id', 'experiment_id'])['n'].sum()
+
+def process_source(job):
+    """ Normalizes the pending files of a source. The chunks are stored as pickles
+    in a temporary directory, so that the outputs can be appended to in order.
+
+    Parameters
+    ----------
+    job : tuple
+        Name and definition of the source, paths of the files to process, task
+        counts per (id, experiment_id) of the files ingested before, temporary
+        directory, and chunk size.
+
+    Returns
+    -------
+    list(dict)
+        Number of rows, chunk files, and task counts of each processed file.
+
+    """
+    name, source, paths, seq_counts, tmp_dir, chunk_size = job
+
+    results = []
+    for file_idx, path in enumerate(paths):
+        previous = seq_counts
+        chunk_paths = []
+        n_rows = 0
+        chunks = pd.read_csv(path, sep=source.get('sep', ','), usecols=list(source['columns'].values()),
+                             chunksize=chunk_size)
+        for chunk_idx, chunk in enumerate(chunks):
+            df, seq_counts = extract.normalize(to_raw(chunk, source), seq_counts)
+            chunk_path = os.path.join(tmp_dir, '{}-{}-{}.pkl'.format(name, file_idx, chunk_idx))
+            df.to_pickle(chunk_path)
+            chunk_paths.append(chunk_path)
+            n_rows += len(df)
+
+        contribution = seq_counts.sub(previous, fill_value=0).astype(int)
+        results.append({'rows': n_rows, 'chunks': chunk_paths, 'counts': counts_to_list(contribution)})
+    return results
+
+def truncate_outputs(paths, manifest, n_files):
+    """ Truncates the outputs to the rows of the first n_files ingested files.
+    Returns False if the outputs do not match the manifest. """
+    files = manifest['files']
+    end = files[n_files]['start'] if n_files < len(files) else manifest['end']
+
+    for key in ['csv', 'rating']:
+        if not os.path.isfile(paths[key]) or os.path.getsize(paths[key]) < end[key]:
+            return False
+    if not columnar.is_columnar(paths['columnar']) or columnar.read_meta(paths['columnar'])['n_rows'] < end['columnar']:
+        return False
+
+    for key in ['csv', 'rating']:
+        os.truncate(paths[key], end[key])
+    columnar.truncate(paths['columnar'], end['columnar'])
+    return True
+
+def append_outputs(paths, df):
+    for key, out_df in [('csv', df), ('rating', extract.to_rating(df))]:
+        header = not os.path.isfile(paths[key]) or os.path.getsize(paths[key]) == 0
+        out_df.to_csv(paths[key], mode='a', header=header, index=False)
+    columnar.append(paths['columnar'], df)
+
+def output_end(paths):
+    """ Returns the current end of the outputs (bytes of the CSV files, rows of the columnar dataset). """
+    return {
+        'csv': os.path.getsize(paths['csv']) if os.path.isfile(paths['csv']) else 0,
+        'rating': os.path.getsize(paths['rating']) if os.path.isfile(paths['rating']) else 0,
+        'columnar': columnar.read_meta(paths['columnar'])['n_rows'] if columnar.is_columnar(paths['columnar']) else 0,
+    }
+
+def ingest(sources, output, n_jobs=None, chunk_size=extract.CHUNK_SIZE, rebuild=False):
+    """ Ingests the new and changed raw files of the sources.
+
+    Parameters
+    ----------
+    sources : dict
+        Dictionary mapping source names to source definitions (see SOURCES).
+
+    output : str
+        Path prefix of the outputs (.csv, -rating.csv, .cols, and .manifest.json).
+
+    n_jobs : int, optional
+        Number of worker processes. None uses all CPUs, 1 processes all sources
+        in the current process.
+
+    chunk_size : int
+        Number of rows read at once.
+
+    rebuild : bool
+        Whether to process all files regardless of the manifest.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping source names to the numbers of processed and skipped
+        files and the number of appended rows.
+
+    """
+    paths = output_paths(output)
+
+    # Current raw files and their hashes
+    current = []
+    for name, source in sources.items():
+        source_hash = hash_source(source)
+        for path in sorted(glob.glob(source['pattern'])):
+            current.append({'path': path, 'source': name, 'sha256': hash_file(path), 'source_hash': source_hash})
+
+    manifest = {'version': MANIFEST_VERSION, 'files': []}
+    if not rebuild and os.path.isfile(paths['manifest']):
+        with open(paths['manifest']) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest['version'] != MANIFEST_VERSION:
+            raise ValueError("Unsupported manifest version {} in '{}'".format(manifest['version'], paths['manifest']))
+
+    # Files are kept up to the first one that changed or was removed
+    known = {(x['path'], x['source'], x['sha256'], x['source_hash']) for x in current}
+    n_kept = 0
+    for entry in manifest['files']:
+        if (entry['path'], entry['source'], entry['sha256'], entry['source_hash']) not in known:
+            break
+        n_kept += 1
+
+    if not manifest['files'] or not truncate_outputs(paths, manifest, n_kept):
+        n_kept = 0
+        for key in ['csv', 'rating']:
+            if os.path.isfile(paths[key]):
+                os.remove(paths[key])
+        if os.path.isdir(paths['columnar']):
+            shutil.rmtree(paths['columnar'])
+
+    kept = manifest['files'][:n_kept]
+    kept_paths = {x['path'] for x in kept}
+    pending = [x for x in current if x['path'] not in kept_paths]
+
+    summary = {
+        name: {'processed': 0, 'skipped': sum(x['source'] == name for x in kept), 'rows': 0} for name in sources
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        jobs = []
+        for name, source in sources.items():
+            files = [x for x in pending if x['source'] == name]
+            if files:
+                seq_counts = counts_from_list([c for x in kept if x['source'] == name for c in x['counts']])
+                jobs.append((name, source, [x['path'] for x in files], seq_counts, tmp_dir, chunk_size))
+
+        if n_jobs == 1 or len(jobs) <= 1:
+            results = [process_source(x) for x in jobs]
+        else:
+            with multiprocessing.Pool(min(n_jobs or os.cpu_count(), len(jobs))) as pool:
+                results = pool.map(process_source, jobs, chunksize=1)
+
+        # Append the rows in the order of the sources and files
+        files = kept
+        for job, job_results in zip(jobs, results):
+            name = job[0]
+            for entry, result in zip([x for x in pending if x['source'] == name], job_results):
+                entry = dict(entry, start=output_end(paths), rows=result['rows'], counts=result['counts'])
+                for chunk_path in result['chunks']:
+                    append_outputs(paths, pd.read_pickle(chunk_path))
+                files.append(entry)
+
+                summary[name]['processed'] += 1
+                summary[name]['rows'] += result['rows']
+
+    manifest = {'version': MANIFEST_VERSION, 'files': files, 'end': output_end(paths)}
+    tmp_path = paths['manifest'] + '.tmp'
+    with open(tmp_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(tmp_path, paths['manifest'])
+
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incrementally ingests raw belief-bias datasets.')
+    parser.add_argument('-s', '--sources', help='JSON file with source definitions (see SOURCES).')
+    parser.add_argument('-o', '--output', default='Trippas2018', help='Path prefix of the outputs.')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='Number of worker processes (0 uses all CPUs).')
+    parser.add_argument('--chunk-size', type=int, default=extract.CHUNK_SIZE, help='Number of rows read at once.')
+    parser.add_argument('--rebuild', action='store_true', help='Process all files regardless of the manifest.')
+    args = parser.parse_args()
+
+    sources = SOURCES
+    if args.sources:
+        with open(args.sources) as sources_file:
+            sources = json.load(sources_file)
+
+    summary = ingest(sources, args.output, n_jobs=args.jobs or None, chunk_size=args.chunk_size,
+                     rebuild=args.rebuild)
+    for name, stats in summary.items():
+        print('{}: {} files processed, {} unchanged, {} rows appended'.format(
+            name, stats['processed'], stats['skipped'], stats['rows']))
@@ -1,80 +1,78 @@
-import logging
-import time
-
 import ccobra
 import numpy as np
 
-import mreasoner
-import fol
-import phm
-
+import counts
+import encoding
+import profiling
+import registry
 
-logger = logging.getLogger(__name__)
 
 class MisinterpretedNecessityRestr(ccobra.CCobraModel):
+    # Ratings indexed by (possible, necessary, believable). Necessary conclusions
+    # are always possible, 0 marks these invalid combinations.
+    RATINGS = np.array([
+        [[1, 2], [0, 0]],
+        [[3, 4], [5, 6]],
+    ])
+
     def __init__(self, name='MisinterpretedNecessity-Restr', method='mReasoner'):
         super(MisinterpretedNecessityRestr, self).__init__(name, ['syllogistic-belief'], ['verify'])
 
-        # Determine method
-        self.method = None
-        if method == 'mReasoner':
-            self.method = mreasoner.MReasoner()
-        elif method == 'fol':
-            self.method = fol.FOL()
-        elif method == 'phm':
-            self.method = phm.PHM()
+        # Determine method (tables are shared between all instances)
+        self.method = registry.create(method)
 
         # Prepare members
         self.time_start = None
 
     def start_participant(self, **kwargs):
-        self.time_start = time.time()
+        self.time_start = profiling.start()
 
     def end_participant(self, identifier, model_log, **kwargs):
-        logger.info('End participant %d (%.2fs)', identifier, time.time() - self.time_start)
+        profiling.stop('MisinterpretedNecessityRestr.participant', self.time_start)
 
     def pre_train(self, dataset, **kwargs):
-        # Train method parameters based on verification response
-        train_data_response = {}
-        for dude_data in dataset:
-            for task_data in dude_data:
-                syl = ccobra.syllogistic.Syllogism(task_data['item'])
-                enc_syllogism = syl.encoded_task
-                enc_conclusion = syl.encode_response(task_data['item'].choices[0])
-
-                key = (enc_syllogism, enc_conclusion)
-                if key not in train_data_response:
-                    train_data_response[key] = [0, 0]
-                train_data_response[key][int(task_data['response'])] += 1
-
-        self.method.fit(train_data_response)
-
+        self.fit_counts(*counts.from_dataset(dataset))
+
+    @profiling.timed()
+    def fit_counts(self, responses, ratings, warm_start=False):
+        # Train method parameters based on verification response. When warm
+        # starting, the counts are added to the data fitted before.
+        if warm_start:
+            self.method.fit_incremental(responses.sum(axis=2))
+        else:
+            self.method.fit(responses.sum(axis=2))
+
+    @profiling.timed()
     def pre_train_person(self, dataset, **kwargs):
         #pass
         self.pre_train([dataset])
 
+    @profiling.timed()
     def predict(self, item, **kwargs):
         return self.predict_rating(item, **kwargs) > 3
 
+    @profiling.timed()
     def predict_rating(self, item, **kwargs):
-        syl = ccobra.syllogistic.Syllogism(item)
-        enc_syllogism = syl.encoded_task
-        enc_conclusion = syl.encode_response(item.choices[0])
+        enc_syllogism, enc_conclusion = encoding.encode_item_str(item)
         bel = kwargs['is_believable']
 
         possible, necessary = self.method.evaluate_conclusion(enc_conclusion, enc_syllogism)
         if necessary and not possible:
             assert False, 'Should never happen'
 
-        if not possible and not bel:
-            return 1
-        elif not possible:
-            return 2
-        elif not necessary and possible and not bel:
-            return 3
-        elif not necessary and bel:
-            return 4
-        elif necessary and not bel:
-            return 5
-        elif necessary and bel:
-            return 6
+        return int(self.RATINGS[int(possible), int(necessary), int(bel)])
+
+    @profiling.timed()
+    def predict_batch(self, idx_syl, idx_concl, is_believable):
+        return self.predict_rating_batch(idx_syl, idx_concl, is_believable) > 3
+
+    @profiling.timed()
+    def predict_rating_batch(self, idx_syl, idx_concl, is_believable):
+        """ Predicts ratings for arrays of syllogism indices, conclusion indices
+        (both in CCOBRA order), and believability flags. """
+        possible, necessary = self.method.evaluate_all()
+        possible = possible[idx_syl, idx_concl]
+        necessary = necessary[idx_syl, idx_concl]
+        assert not np.any(necessary & ~possible), 'Should never happen'
+
+        return self.RATINGS[possible.astype(int), necessary.astype(int), np.asarray(is_believable, dtype=int)]
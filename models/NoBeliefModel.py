@@ -1,69 +1,72 @@
-import logging
-import time
-
 import ccobra
 import numpy as np
 
-import mreasoner
-import fol
-import phm
-
-logger = logging.getLogger(__name__)
+import counts
+import encoding
+import profiling
+import registry
 
 class NoBeliefModel(ccobra.CCobraModel):
+    # Ratings indexed by (possible, necessary, believable)
+    RATINGS = np.array([
+        [[2, 2], [5, 5]],
+        [[2, 2], [5, 5]],
+    ])
+
     def __init__(self, name='NoBelief', method='mReasoner'):
         super(NoBeliefModel, self).__init__(name, ['syllogistic-belief'], ['verify'])
 
-        # Determine method
-        self.method = None
-        if method == 'mReasoner':
-            self.method = mreasoner.MReasoner()
-        elif method == 'fol':
-            self.method = fol.FOL()
-        elif method == 'phm':
-            self.method = phm.PHM()
+        # Determine method (tables are shared between all instances)
+        self.method = registry.create(method)
 
         # Prepare members
         self.time_start = None
 
     def start_participant(self, **kwargs):
-        self.time_start = time.time()
+        self.time_start = profiling.start()
 
     def end_participant(self, identifier, model_log, **kwargs):
-        logger.info('End participant %d (%.2fs)', identifier, time.time() - self.time_start)
+        profiling.stop('NoBeliefModel.participant', self.time_start)
 
     def pre_train(self, dataset, **kwargs):
-        # Train method parameters based on verification response
-        train_data_response = {}
-        for dude_data in dataset:
-            for task_data in dude_data:
-                syl = ccobra.syllogistic.Syllogism(task_data['item'])
-                enc_syllogism = syl.encoded_task
-                enc_conclusion = syl.encode_response(task_data['item'].choices[0])
+        self.fit_counts(*counts.from_dataset(dataset))
 
-                key = (enc_syllogism, enc_conclusion)
-                if key not in train_data_response:
-                    train_data_response[key] = [0, 0]
-                train_data_response[key][int(task_data['response'])] += 1
-
-        self.method.fit(train_data_response)
+    @profiling.timed()
+    def fit_counts(self, responses, ratings, warm_start=False):
+        # Train method parameters based on verification response. When warm
+        # starting, the counts are added to the data fitted before.
+        if warm_start:
+            self.method.fit_incremental(responses.sum(axis=2))
+        else:
+            self.method.fit(responses.sum(axis=2))
 
+    @profiling.timed()
     def pre_train_person(self, dataset, **kwargs):
         #pass
         self.pre_train([dataset])
 
+    @profiling.timed()
     def predict(self, item, **kwargs):
-        syl = ccobra.syllogistic.Syllogism(item)
-        enc_syllogism = syl.encoded_task
-        enc_conclusion = syl.encode_response(item.choices[0])
+        enc_syllogism, enc_conclusion = encoding.encode_item_str(item)
         return self.method.evaluate_conclusion(enc_conclusion, enc_syllogism)[1]
 
+    @profiling.timed()
     def predict_rating(self, item, **kwargs):
-        syl = ccobra.syllogistic.Syllogism(item)
-        enc_syllogism = syl.encoded_task
-        enc_conclusion = syl.encode_response(item.choices[0])
+        enc_syllogism, enc_conclusion = encoding.encode_item_str(item)
+        bel = kwargs.get('is_believable', False)
 
         possible, necessary = self.method.evaluate_conclusion(enc_conclusion, enc_syllogism)
-        if necessary:
-            return 5
-        return 2
+        return int(self.RATINGS[int(possible), int(necessary), int(bel)])
+
+    @profiling.timed()
+    def predict_batch(self, idx_syl, idx_concl, is_believable):
+        return self.predict_rating_batch(idx_syl, idx_concl, is_believable) > 3
+
+    @profiling.timed()
+    def predict_rating_batch(self, idx_syl, idx_concl, is_believable):
+        """ Predicts ratings for arrays of syllogism indices, conclusion indices
+        (both in CCOBRA order), and believability flags. """
+        possible, necessary = self.method.evaluate_all()
+        possible = possible[idx_syl, idx_concl]
+        necessary = necessary[idx_syl, idx_concl]
+        return self.RATINGS[possible.astype(int), necessary.astype(int), np.asarray(is_believable, dtype=int)]
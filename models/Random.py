@@ -1,12 +1,16 @@
 import ccobra
 import numpy as np
 
+import profiling
+
 class RandomModel(ccobra.CCobraModel):
     def __init__(self, name='Random'):
         super(RandomModel, self).__init__(name, ['syllogistic-belief'], ['verify'])
 
+    @profiling.timed()
     def predict(self, item, **kwargs):
         return np.random.choice([True, False])
 
+    @profiling.timed()
     def predict_rating(self, item, **kwargs):
         return int(np.random.randint(1, 7))
\ No newline at end of file
@@ -1,73 +1,71 @@
-import logging
-import time
-
 import ccobra
 import numpy as np
 
-import mreasoner
-import fol
-import phm
-
+import counts
+import encoding
+import profiling
+import registry
 
-logger = logging.getLogger(__name__)
 
 class SelectiveScrutinyRestr(ccobra.CCobraModel):
+    # Ratings indexed by (possible, necessary, believable)
+    RATINGS = np.array([
+        [[2, 5], [4, 6]],
+        [[2, 5], [4, 6]],
+    ])
+
     def __init__(self, name='SelectiveScrutiny-Restr', method='mReasoner'):
         super(SelectiveScrutinyRestr, self).__init__(name, ['syllogistic-belief'], ['verify'])
 
-        # Determine method
-        self.method = None
-        if method == 'mReasoner':
-            self.method = mreasoner.MReasoner()
-        elif method == 'fol':
-            self.method = fol.FOL()
-        elif method == 'phm':
-            self.method = phm.PHM()
+        # Determine method (tables are shared between all instances)
+        self.method = registry.create(method)
 
         # Prepare members
         self.time_start = None
 
     def start_participant(self, **kwargs):
-        self.time_start = time.time()
+        self.time_start = profiling.start()
 
     def end_participant(self, identifier, model_log, **kwargs):
-        logger.info('End participant %d (%.2fs)', identifier, time.time() - self.time_start)
+        profiling.stop('SelectiveScrutinyRestr.participant', self.time_start)
 
     def pre_train(self, dataset, **kwargs):
-        # Train method parameters based on verification response
-        train_data_response = {}
-        for dude_data in dataset:
-            for task_data in dude_data:
-                syl = ccobra.syllogistic.Syllogism(task_data['item'])
-                enc_syllogism = syl.encoded_task
-                enc_conclusion = syl.encode_response(task_data['item'].choices[0])
-
-                key = (enc_syllogism, enc_conclusion)
-                if key not in train_data_response:
-                    train_data_response[key] = [0, 0]
-                train_data_response[key][int(task_data['response'])] += 1
-
-        self.method.fit(train_data_response)
+        self.fit_counts(*counts.from_dataset(dataset))
+
+    @profiling.timed()
+    def fit_counts(self, responses, ratings, warm_start=False):
+        # Train method parameters based on verification response. When warm
+        # starting, the counts are added to the data fitted before.
+        if warm_start:
+            self.method.fit_incremental(responses.sum(axis=2))
+        else:
+            self.method.fit(responses.sum(axis=2))
 
+    @profiling.timed()
     def pre_train_person(self, dataset, **kwargs):
         self.pre_train([dataset])
 
+    @profiling.timed()
     def predict(self, item, **kwargs):
         return self.predict_rating(item, **kwargs) > 3
 
+    @profiling.timed()
     def predict_rating(self, item, **kwargs):
-        syl = ccobra.syllogistic.Syllogism(item)
-        enc_syllogism = syl.encoded_task
-        enc_conclusion = syl.encode_response(item.choices[0])
+        enc_syllogism, enc_conclusion = encoding.encode_item_str(item)
         bel = kwargs['is_believable']
 
         possible, necessary = self.method.evaluate_conclusion(enc_conclusion, enc_syllogism)
-
-        if bel and necessary:
-            return 6
-        elif bel:
-            return 5
-        elif necessary:
-            return 4
-        else:
-            return 2
+        return int(self.RATINGS[int(possible), int(necessary), int(bel)])
+
+    @profiling.timed()
+    def predict_batch(self, idx_syl, idx_concl, is_believable):
+        return self.predict_rating_batch(idx_syl, idx_concl, is_believable) > 3
+
+    @profiling.timed()
+    def predict_rating_batch(self, idx_syl, idx_concl, is_believable):
+        """ Predicts ratings for arrays of syllogism indices, conclusion indices
+        (both in CCOBRA order), and believability flags. """
+        possible, necessary = self.method.evaluate_all()
+        possible = possible[idx_syl, idx_concl]
+        necessary = necessary[idx_syl, idx_concl]
+        return self.RATINGS[possible.astype(int), necessary.astype(int), np.asarray(is_believable, dtype=int)]
@@ -1,41 +1,123 @@
 import ccobra
 import numpy as np
 
+import encoding
+import profiling
+
+N_RATINGS = 6
+
+# Rating predicted if a participant has not given any ratings yet (median of the scale)
+DEFAULT_RATING = (1 + N_RATINGS) / 2
+
+def medians(histogram):
+    """ Computes medians (as np.median) from rating histograms.
+
+    Parameters
+    ----------
+    histogram : np.ndarray
+        Rating counts of shape (..., 6) indexed by rating - 1.
+
+    Returns
+    -------
+    np.ndarray
+        Median ratings of shape (...), NaN for empty histograms.
+
+    """
+    cumulative = np.cumsum(histogram, axis=-1)
+    n_ratings = cumulative[..., -1:]
+
+    # The k-th smallest rating is 1 + the number of ratings whose cumulative count is at most k
+    lower = (cumulative <= (n_ratings - 1) // 2).sum(axis=-1) + 1
+    upper = (cumulative <= n_ratings // 2).sum(axis=-1) + 1
+    return np.where(n_ratings[..., 0] > 0, (lower + upper) / 2, np.nan)
+
 class UserMedian(ccobra.CCobraModel):
     def __init__(self, name='UserMedian', only_integer=True):
         super(UserMedian, self).__init__(name, ['syllogistic-belief'], ['verify'])
-        self.database = {}
         self.only_integer = only_integer
 
+        # Rating counts and their medians indexed by syllogism, conclusion (and rating - 1)
+        self.histogram = np.zeros((len(encoding.SYLLOGISMS), len(encoding.RESPONSES), N_RATINGS), dtype=np.int64)
+        self.medians = np.full(self.histogram.shape[:2], np.nan)
+
+        # Median of all ratings, used for tasks without ratings
+        self.total = np.zeros(N_RATINGS, dtype=np.int64)
+        self.fallback = DEFAULT_RATING
+
+    @profiling.timed()
     def pre_train_person(self, dataset):
-        for task in dataset:
-            item = task["item"]
-            syl = ccobra.syllogistic.Syllogism(item)
-            rating = task["rating"]
-            enc_task = syl.encoded_task
-            enc_resp = syl.encode_response(item.choices[0])
-            
-            key = "{}_{}".format(enc_task, enc_resp)
-            if key not in self.database:
-                self.database[key] = []
-            self.database[key].append(rating)
-            
-        for key, value in self.database.items():
-            self.database[key] = np.median(value)
+        if not dataset:
+            return
+
+        encoded = np.array([encoding.encode_item(x['item']) for x in dataset], dtype=np.int64).reshape(-1, 2)
+        ratings = np.array([x['rating'] for x in dataset], dtype=np.int64)
 
+        cells = (encoded[:, 0] * self.histogram.shape[1] + encoded[:, 1]) * N_RATINGS + ratings - 1
+        self.histogram += np.bincount(cells, minlength=self.histogram.size).reshape(self.histogram.shape)
+        self.medians = medians(self.histogram)
+
+        self.total = self.histogram.sum(axis=(0, 1))
+        self.fallback = float(medians(self.total))
+
+    def add_rating(self, item, rating):
+        """ Adds a rating and updates the affected medians. """
+        idx_syl, idx_concl = encoding.encode_item(item)
+        self.histogram[idx_syl, idx_concl, rating - 1] += 1
+        self.medians[idx_syl, idx_concl] = medians(self.histogram[idx_syl, idx_concl])
+
+        self.total[rating - 1] += 1
+        self.fallback = float(medians(self.total))
+
+    @profiling.timed()
+    def adapt(self, item, target, **kwargs):
+        # Only the rating is modeled, the verification response is ignored. If
+        # adapt_rating is called for the same task as well, all counts are
+        # doubled, which leaves the medians unchanged.
+        if 'rating' in kwargs:
+            self.add_rating(item, int(kwargs['rating']))
+
+    @profiling.timed()
+    def adapt_rating(self, item, target, **kwargs):
+        self.add_rating(item, int(target))
+
+    def to_prediction(self, rating):
+        # Non-integer medians are rounded up or down randomly
+        if not self.only_integer:
+            return rating
+        if int(rating) != rating and np.random.rand() >= 0.5:
+            return int(np.ceil(rating))
+        return int(rating)
+
+    @profiling.timed()
     def predict(self, item, **kwargs):
         rating = self.predict_rating(item, **kwargs)
         return rating > 3
 
+    @profiling.timed()
     def predict_rating(self, item, **kwargs):
-        syl = ccobra.syllogistic.Syllogism(item)
-        enc_task = syl.encoded_task
-        enc_resp = syl.encode_response(item.choices[0])
-        key = "{}_{}".format(enc_task, enc_resp)
-        rating = self.database[key]
-        if self.only_integer and int(rating) != rating:
-            if np.random.rand() >= 0.5:
-                return int(np.ceil(rating))
-            else:
-                return int(rating)
-        return rating
\ No newline at end of file
+        idx_syl, idx_concl = encoding.encode_item(item)
+        rating = self.medians[idx_syl, idx_concl]
+        if np.isnan(rating):
+            rating = self.fallback
+        return self.to_prediction(float(rating))
+
+    @profiling.timed()
+    def predict_batch(self, idx_syl, idx_concl, is_believable):
+        return self.predict_rating_batch(idx_syl, idx_concl, is_believable) > 3
+
+    @profiling.timed()
+    def predict_rating_batch(self, idx_syl, idx_concl, is_believable):
+        """ Predicts ratings for arrays of syllogism indices, conclusion indices
+        (both in CCOBRA order), and believability flags. Non-integer medians are
+        rounded randomly as in predict_rating (drawing from the same random
+        numbers in the same order). """
+        ratings = self.medians[idx_syl, idx_concl]
+        ratings = np.where(np.isnan(ratings), self.fallback, ratings)
+        if not self.only_integer:
+            return ratings
+
+        fractional = ratings != np.floor(ratings)
+        round_up = np.random.rand(int(fractional.sum())) >= 0.5
+        ratings = np.floor(ratings).astype(int)
+        ratings[fractional] += round_up
+        return ratings
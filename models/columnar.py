@@ -0,0 +1,401 @@
+""" Compact columnar version of the CCOBRA datasets in the format of
+data/Trippas2018.csv. A dataset is stored as directory containing one .npy file
+per column and a meta.json file, so that the columns can be memory-mapped
+without parsing:
+
+- Tasks and conclusions are stored as int8 indices into SYLLOGISMS and
+  RESPONSES (see encoding.py), ratings as int8, and sequence numbers as int32.
+- The boolean columns (response, is_believable, is_valid) are packed into the
+  bits of a single uint8 column (see FLAGS).
+- Participant and experiment identifiers are dictionary-encoded, i.e., stored
+  as codes into value lists kept in meta.json.
+
+Rows are appended in chunks (see append). The number of rows in meta.json is
+updated last, so that an interrupted append leaves the previous rows intact.
+
+Usage: python columnar.py data.csv output_dir [chunk_size]
+
+"""
+
+import io
+import json
+import os
+import shutil
+import sys
+
+import ccobra
+import numpy as np
+import pandas as pd
+
+import counts
+import encoding
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+# Stored columns and their types
+COLUMNS = {
+    'id': np.int32,
+    'sequence': np.int32,
+    'enc_task': np.int8,
+    'enc_resp': np.int8,
+    'rating': np.int8,
+    'flags': np.uint8,
+    'experiment_id': np.int16,
+    'experiment_description': np.int16,
+}
+
+# Columns stored as codes into the value lists in meta.json
+DICTIONARY_COLUMNS = ['id', 'experiment_id', 'experiment_description']
+
+# Bits of the boolean columns in the flags column
+FLAGS = {'response': 1, 'is_believable': 2, 'is_valid': 4}
+
+# Readers and writers of the .npy headers by format version
+NPY_HEADERS = {
+    (1, 0): (np.lib.format.read_array_header_1_0, np.lib.format.write_array_header_1_0),
+    (2, 0): (np.lib.format.read_array_header_2_0, np.lib.format.write_array_header_2_0),
+}
+
+# Column order of data/Trippas2018.csv
+CSV_COLUMNS = [
+    'id',
+    'sequence',
+    'task',
+    'choices',
+    'response',
+    'domain',
+    'response_type',
+    'rating',
+    'experiment_id',
+    'experiment_description',
+    'enc_task',
+    'enc_resp',
+    'is_believable',
+    'is_valid',
+]
+
+# Columns of the CSV format which are not stored, but derived from the encodings
+DERIVED_COLUMNS = ['task', 'choices', 'domain', 'response_type']
+
+QUANTIFIERS = {'A': 'All', 'I': 'Some', 'E': 'No', 'O': 'Some not'}
+FIGURES = {'1': '{};A;B/{};B;C', '2': '{};B;A/{};C;B', '3': '{};A;B/{};C;B', '4': '{};B;A/{};B;C'}
+
+# Task and choice strings of all syllogisms and conclusions
+TASKS = {
+    x: FIGURES[x[-1]].format(QUANTIFIERS[x[0]], QUANTIFIERS[x[1]]) for x in encoding.SYLLOGISMS
+}
+CHOICES = {
+    x: ('{};A;C' if x[1:] == 'ac' else '{};C;A').format(QUANTIFIERS[x[0]])
+    for x in encoding.RESPONSES if x != 'NVC'
+}
+
+def is_columnar(path):
+    """ Checks whether a path refers to a dataset in the columnar format. """
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+    if meta['version'] != FORMAT_VERSION:
+        raise ValueError("Unsupported columnar format version {} in '{}'".format(meta['version'], path))
+    return meta
+
+def write_meta(path, meta):
+    tmp_path = os.path.join(path, META_FILE + '.tmp')
+    with open(tmp_path, 'w') as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+def encode_frame(df, meta):
+    """ Encodes a dataframe in the CSV format into the stored columns.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe in the format of data/Trippas2018.csv.
+
+    meta : dict
+        Meta data of the dataset. Values of the dictionary-encoded columns that
+        are not known yet are added to it.
+
+    Returns
+    -------
+    dict(str, np.ndarray)
+        Encoded columns.
+
+    """
+    missing = (set(CSV_COLUMNS) - set(DERIVED_COLUMNS)) - set(df.columns)
+    if missing:
+        raise ValueError("Data does not contain columns: {}".format(missing))
+
+    for column in ['domain', 'response_type']:
+        values = set(df[column].unique())
+        if values - {meta[column]}:
+            raise ValueError("Column '{}' has values {}, expected '{}'".format(column, values, meta[column]))
+
+    columns = {
+        'sequence': df['sequence'].to_numpy(),
+        'enc_task': df['enc_task'].map(encoding.SYLLOGISM_INDEX).to_numpy(),
+        'enc_resp': df['enc_resp'].map(encoding.RESPONSE_INDEX).to_numpy(),
+        'rating': df['rating'].to_numpy(),
+        'flags': sum(df[x].to_numpy(dtype=bool).astype(np.uint8) * bit for x, bit in FLAGS.items()),
+    }
+    if not (df['enc_task'].isin(list(encoding.SYLLOGISM_INDEX)).all()
+            and df['enc_resp'].isin(list(encoding.RESPONSE_INDEX)).all()):
+        raise ValueError("Data contains unknown task or conclusion encodings")
+
+    for column in DICTIONARY_COLUMNS:
+        values = meta['dictionaries'][column]
+        codes = {x: idx for idx, x in enumerate(values)}
+        for value in df[column].unique().tolist():
+            if value not in codes:
+                codes[value] = len(values)
+                values.append(value)
+        columns[column] = df[column].map(codes).to_numpy()
+
+    for column, dtype in COLUMNS.items():
+        if np.iinfo(dtype).max < columns[column].max(initial=0):
+            raise ValueError("Values of column '{}' exceed {}".format(column, np.dtype(dtype).name))
+        columns[column] = columns[column].astype(dtype)
+    return columns
+
+def append_array(path, values, n_rows):
+    """ Appends values to a one-dimensional .npy file. The shape in the header is
+    rewritten in place. Rows beyond n_rows (e.g., from an interrupted append)
+    are discarded. """
+    if not os.path.isfile(path):
+        np.save(path, values)
+        return
+
+    with open(path, 'r+b') as npy_file:
+        read_header, write_header = NPY_HEADERS[np.lib.format.read_magic(npy_file)]
+        _, fortran_order, dtype = read_header(npy_file)
+        offset = npy_file.tell()
+
+        # Headers are padded, so that the shape can grow without moving the data
+        header = io.BytesIO()
+        write_header(header, {
+            'descr': np.lib.format.dtype_to_descr(dtype),
+            'fortran_order': fortran_order,
+            'shape': (n_rows + len(values),)
+        })
+        if len(header.getvalue()) != offset:
+            raise ValueError("Cannot grow the header of '{}'".format(path))
+
+        npy_file.seek(offset + n_rows * dtype.itemsize)
+        npy_file.truncate()
+        npy_file.write(values.astype(dtype).tobytes())
+        npy_file.seek(0)
+        npy_file.write(header.getvalue())
+
+def append(path, df):
+    """ Appends the rows of a dataframe in the CSV format to a columnar dataset,
+    which is created if it does not exist.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the dataset.
+
+    df : pd.DataFrame
+        Dataframe in the format of data/Trippas2018.csv.
+
+    """
+    if is_columnar(path):
+        meta = read_meta(path)
+    else:
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            'version': FORMAT_VERSION,
+            'n_rows': 0,
+            'domain': df['domain'].iloc[0] if len(df) else 'syllogistic-belief',
+            'response_type': df['response_type'].iloc[0] if len(df) else 'verify',
+            'dictionaries': {x: [] for x in DICTIONARY_COLUMNS}
+        }
+        for column in COLUMNS:
+            npy_path = os.path.join(path, column + '.npy')
+            if os.path.isfile(npy_path):
+                os.remove(npy_path)
+
+    columns = encode_frame(df, meta)
+    for column, values in columns.items():
+        append_array(os.path.join(path, column + '.npy'), values, meta['n_rows'])
+
+    meta['n_rows'] += len(df)
+    write_meta(path, meta)
+
+def write(path, df):
+    """ Writes a dataframe in the CSV format as columnar dataset, replacing an
+    existing dataset. """
+    if is_columnar(path):
+        shutil.rmtree(path)
+    append(path, df)
+
+def truncate(path, n_rows):
+    """ Discards the rows of a columnar dataset from n_rows on. The column files
+    are shortened by the next append. """
+    meta = read_meta(path)
+    if n_rows > meta['n_rows']:
+        raise ValueError("Cannot truncate '{}' with {} rows to {} rows".format(path, meta['n_rows'], n_rows))
+    meta['n_rows'] = n_rows
+    write_meta(path, meta)
+
+def load(path):
+    """ Loads a columnar dataset with memory-mapped columns (see Dataset). """
+    return Dataset(path)
+
+class Dataset():
+    """ Columnar dataset whose columns are memory-mapped, so that only the parts
+    accessed are read from disk. """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_meta(path)
+        self.n_rows = self.meta['n_rows']
+        self.dictionaries = self.meta['dictionaries']
+
+        self.columns = {}
+        for column in COLUMNS:
+            npy_path = os.path.join(path, column + '.npy')
+            # Empty files cannot be memory-mapped
+            mmap_mode = 'r' if self.n_rows else None
+            self.columns[column] = np.load(npy_path, mmap_mode=mmap_mode)[:self.n_rows]
+
+    def __len__(self):
+        return self.n_rows
+
+    def flag(self, name):
+        """ Returns a boolean column stored in the flags (see FLAGS). """
+        return (self.columns['flags'] & FLAGS[name]) != 0
+
+    def values(self, name):
+        """ Returns the decoded values of a dictionary-encoded column. """
+        dictionary = np.empty(len(self.dictionaries[name]), dtype=object)
+        dictionary[:] = self.dictionaries[name]
+        return dictionary[self.columns[name]]
+
+    def counts(self):
+        """ Returns the response and rating count tensors of the dataset (see
+        counts.from_arrays). """
+        return counts.from_arrays(
+            self.columns['enc_task'], self.columns['enc_resp'],
+            self.flag('is_believable'), self.flag('response'), self.columns['rating'])
+
+    def to_frame(self):
+        """ Returns the dataset as dataframe in the format of data/Trippas2018.csv. """
+        enc_task = np.asarray(encoding.SYLLOGISMS, dtype=object)[self.columns['enc_task']]
+        enc_resp = np.asarray(encoding.RESPONSES, dtype=object)[self.columns['enc_resp']]
+
+        df = pd.DataFrame({
+            'id': self.values('id'),
+            'sequence': self.columns['sequence'].astype(np.int64),
+            'task': pd.Series(enc_task).map(TASKS),
+            'choices': pd.Series(enc_resp).map(CHOICES),
+            'response': self.flag('response'),
+            'domain': self.meta['domain'],
+            'response_type': self.meta['response_type'],
+            'rating': self.columns['rating'].astype(np.int64),
+            'experiment_id': self.values('experiment_id'),
+            'experiment_description': self.values('experiment_description'),
+            'enc_task': enc_task,
+            'enc_resp': enc_resp,
+            'is_believable': self.flag('is_believable'),
+            'is_valid': self.flag('is_valid'),
+        })
+        return df.infer_objects()[CSV_COLUMNS]
+
+    def participant_order(self):
+        """ Returns the participant identifiers in CCOBRA order (sorted) and the
+        row indices of their tasks ordered by sequence number. """
+        dictionary = self.dictionaries['id']
+
+        # Identifiers of different sources may mix numbers and strings
+        sorted_codes = sorted(range(len(dictionary)), key=lambda x: (isinstance(dictionary[x], str), dictionary[x]))
+        ranks = np.empty(len(dictionary), dtype=np.int64)
+        ranks[sorted_codes] = np.arange(len(dictionary))
+
+        participant_ranks = ranks[self.columns['id']]
+        order = np.lexsort((self.columns['sequence'], participant_ranks))
+        bounds = np.flatnonzero(np.diff(participant_ranks[order])) + 1
+        groups = np.split(order, bounds) if len(order) else []
+        return [dictionary[self.columns['id'][x[0]]] for x in groups], groups
+
+    def tasks(self):
+        """ Returns the encoded tasks of each participant as dictionary mapping
+        participant identifiers to syllogism indices, conclusion indices, and
+        believability flags (in the order of to_eval_dict). """
+        believable = self.flag('is_believable')
+        return {
+            ident: (self.columns['enc_task'][rows].astype(int), self.columns['enc_resp'][rows].astype(int),
+                    believable[rows])
+            for ident, rows in zip(*self.participant_order())
+        }
+
+    def to_eval_dict(self, target_columns=('response', 'rating')):
+        """ Converts the dataset into the dictionary mapping participant
+        identifiers to lists of task dictionaries, as produced by
+        ccobra.CCobraData.to_eval_dict for the CSV version.
+
+        Parameters
+        ----------
+        target_columns : list(str)
+            Columns used as targets (response and/or rating).
+
+        Returns
+        -------
+        dict(object, list(dict))
+            Task dictionaries of each participant.
+
+        """
+        if set(target_columns) - {'response', 'rating'}:
+            raise ValueError("Unsupported target columns: {}".format(set(target_columns) - {'response', 'rating'}))
+
+        # Columns as lists of Python values (as obtained from CCobraData)
+        values = {
+            'response': self.flag('response').tolist(),
+            'rating': self.columns['rating'].tolist(),
+            'experiment_id': self.values('experiment_id').tolist(),
+            'experiment_description': self.values('experiment_description').tolist(),
+            'enc_task': [encoding.SYLLOGISMS[x] for x in self.columns['enc_task'].tolist()],
+            'enc_resp': [encoding.RESPONSES[x] for x in self.columns['enc_resp'].tolist()],
+            'is_believable': self.flag('is_believable').tolist(),
+            'is_valid': self.flag('is_valid').tolist(),
+        }
+        aux_columns = [x for x in CSV_COLUMNS if x in values and x not in target_columns]
+        sequence = self.columns['sequence'].tolist()
+        domain = self.meta['domain']
+        response_type = self.meta['response_type']
+
+        dataset = {}
+        for ident, rows in zip(*self.participant_order()):
+            subj_data = []
+            for row in rows.tolist():
+                aux = {x: values[x][row] for x in aux_columns}
+                targets = {x: values[x][row] for x in target_columns}
+                task_dict = {
+                    'item': ccobra.Item(
+                        ident, domain, TASKS[values['enc_task'][row]], response_type,
+                        CHOICES[values['enc_resp'][row]], sequence[row]),
+                    **targets,
+                    'aux': aux,
+                    'full': dict(aux, **targets)
+                }
+                subj_data.append(task_dict)
+            dataset[ident] = subj_data
+        return dataset
+
+def convert(csv_path, path, chunk_size=100000):
+    """ Converts a dataset in the CSV format (e.g., created with data/generate.py)
+    into the columnar format in chunks. """
+    if is_columnar(path):
+        shutil.rmtree(path)
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        append(path, chunk)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Usage: python columnar.py data.csv output_dir [chunk_size]')
+        sys.exit(1)
+
+    convert(sys.argv[1], sys.argv[2], *[int(x) for x in sys.argv[3:4]])
@@ -0,0 +1,183 @@
+import numpy as np
+
+import encoding
+
+N_SYLLOGISMS = len(encoding.SYLLOGISMS)
+N_CONCLUSIONS = len(encoding.RESPONSES)
+N_CELLS = N_SYLLOGISMS * N_CONCLUSIONS * 2
+N_RATINGS = 6
+
+
+def from_dict(train_data):
+    """ Converts training data in dictionary form into a dense count tensor.
+
+    Parameters
+    ----------
+    train_data : dict((str, str), list(int))
+        Dictionary mapping (syllogism, conclusion) to the number of rejections
+        and acceptances of the conclusion.
+
+    Returns
+    -------
+    np.ndarray
+        Integer array of shape (64, 9, 2) indexed by syllogism, conclusion (both
+        in CCOBRA order), and response (0 = rejected, 1 = accepted).
+
+    """
+    counts = np.zeros((N_SYLLOGISMS, N_CONCLUSIONS, 2), dtype=np.int32)
+    for (syl, concl), val in train_data.items():
+        counts[encoding.SYLLOGISM_INDEX[syl], encoding.RESPONSE_INDEX[concl]] += val
+    return counts
+
+
+def as_tensor(train_data):
+    """ Returns the training data as dense count tensor (see from_dict). Tensors
+    are passed through unchanged.
+
+    """
+    if isinstance(train_data, dict):
+        return from_dict(train_data)
+    return np.asarray(train_data)
+
+
+def from_arrays(idx_syl, idx_concl, believable, response, rating=None):
+    """ Builds the response and rating count tensors from encoded tasks.
+
+    Parameters
+    ----------
+    idx_syl : np.ndarray
+        Syllogism indices (CCOBRA order).
+
+    idx_concl : np.ndarray
+        Conclusion indices (CCOBRA order).
+
+    believable : np.ndarray
+        Flags indicating whether the conclusions are believable.
+
+    response : np.ndarray
+        Flags indicating whether the conclusions were accepted.
+
+    rating : np.ndarray, optional
+        Ratings (1-6) of the conclusions.
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+        Integer tensors of shape (64, 9, 2, 2) and (64, 9, 2, 6) indexed by
+        syllogism, conclusion, believability, and response or rating - 1,
+        respectively. Summing the response tensor over the believability axis
+        yields the (64, 9, 2) tensor used by the syllogistic models. If no
+        ratings are given, the rating tensor is empty.
+
+    """
+    cells = (np.asarray(idx_syl, dtype=np.int64) * N_CONCLUSIONS + idx_concl) * 2 \
+        + np.asarray(believable, dtype=np.int64)
+
+    responses = np.bincount(
+        cells * 2 + np.asarray(response, dtype=np.int64),
+        minlength=N_CELLS * 2).astype(np.int32).reshape(N_SYLLOGISMS, N_CONCLUSIONS, 2, 2)
+
+    ratings = np.zeros((N_SYLLOGISMS, N_CONCLUSIONS, 2, N_RATINGS), dtype=np.int32)
+    if rating is not None:
+        ratings = np.bincount(
+            cells * N_RATINGS + np.asarray(rating, dtype=np.int64) - 1,
+            minlength=N_CELLS * N_RATINGS).astype(np.int32).reshape(ratings.shape)
+
+    return responses, ratings
+
+
+def from_dataset(dataset):
+    """ Builds the response and rating count tensors (see from_arrays) from a
+    CCOBRA dataset.
+
+    Parameters
+    ----------
+    dataset : list(list(dict))
+        List of participants containing lists of task dictionaries.
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+        Response and rating count tensors.
+
+    """
+    tasks = [x for dude_data in dataset for x in dude_data]
+    encoded = np.array([encoding.encode_item(x['item']) for x in tasks], dtype=np.int64).reshape(-1, 2)
+    believable = [x['full']['is_believable'] for x in tasks]
+    response = [x['response'] for x in tasks]
+
+    rating = None
+    if tasks and all('rating' in x for x in tasks):
+        rating = [x['rating'] for x in tasks]
+
+    return from_arrays(encoded[:, 0], encoded[:, 1], believable, response, rating)
+
+
+def from_dataframe(df):
+    """ Builds the response and rating count tensors (see from_arrays) from a
+    dataframe in the format of data/Trippas2018.csv.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe containing the columns enc_task, enc_resp, is_believable,
+        response, and (optionally) rating.
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+        Response and rating count tensors.
+
+    """
+    rating = df['rating'].to_numpy() if 'rating' in df else None
+    return from_arrays(
+        df['enc_task'].map(encoding.SYLLOGISM_INDEX).to_numpy(),
+        df['enc_resp'].map(encoding.RESPONSE_INDEX).to_numpy(),
+        df['is_believable'].to_numpy(),
+        df['response'].to_numpy(),
+        rating
+    )
+
+
+def count_hits(predictions, responses):
+    """ Counts the responses matching predicted verifications.
+
+    Parameters
+    ----------
+    predictions : np.ndarray
+        Boolean predictions of shape (..., 64, 9, 2) indexed by syllogism,
+        conclusion, and believability.
+
+    responses : np.ndarray
+        Response count tensor of shape (64, 9, 2, 2) (see from_arrays).
+
+    Returns
+    -------
+    np.ndarray
+        Number of correctly predicted responses for each leading index.
+
+    """
+    hits = np.where(predictions, responses[..., 1], responses[..., 0])
+    return hits.reshape(hits.shape[:-3] + (-1,)).sum(axis=-1)
+
+
+def sum_abs_errors(predictions, ratings):
+    """ Sums the absolute differences between predicted and given ratings.
+
+    Parameters
+    ----------
+    predictions : np.ndarray
+        Predicted ratings of shape (..., 64, 9, 2) indexed by syllogism,
+        conclusion, and believability.
+
+    ratings : np.ndarray
+        Rating count tensor of shape (64, 9, 2, 6) (see from_arrays).
+
+    Returns
+    -------
+    np.ndarray
+        Sum of absolute errors for each leading index.
+
+    """
+    errors = np.abs(predictions[..., None] - np.arange(1, N_RATINGS + 1))
+    return np.einsum('...ijkr,ijkr->...', errors, ratings)
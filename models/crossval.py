@@ -0,0 +1,170 @@
+""" Leave-one-participant-out and k-fold evaluation based on count tensors.
+
+All belief models and portfolios are fitted on response and rating count
+tensors (see counts.py), so the training data of a fold are the counts of the
+whole dataset minus the counts of the held-out participants. The model is
+fitted on the whole dataset once and each fold is derived from this fit by
+subtracting the held-out counts with an incremental fit (fit_counts with
+warm_start), which only touches the cells the held-out participants responded
+to.
+
+Usage: python crossval.py data.csv [model] [n_folds]
+
+"""
+
+import copy
+import sys
+
+import numpy as np
+import pandas as pd
+
+import counts
+import parallel
+
+import portfolio
+import portfolio_belief
+import SelectiveScrutinyModel as ss
+import MisinterpretedNecessity as mn
+import NoBeliefModel as nobel
+
+MODELS = {
+    "portfolio": portfolio.Portfolio,
+    "portfolio_belief": portfolio_belief.BeliefPortfolio,
+    "nobel": nobel.NoBeliefModel,
+    "mn": mn.MisinterpretedNecessityRestr,
+    "ss": ss.SelectiveScrutinyRestr
+}
+
+def participant_counts(dataset):
+    """ Builds the response and rating count tensors (see counts.from_arrays)
+    of each participant.
+
+    Parameters
+    ----------
+    dataset : dict
+        Dictionary mapping participant identifiers to lists of task
+        dictionaries (see parallel.load_dataset).
+
+    Returns
+    -------
+    dict
+        Dictionary mapping participant identifiers to tuples of response and
+        rating count tensors.
+
+    """
+    return {ident: counts.from_dataset([data]) for ident, data in dataset.items()}
+
+def make_folds(identifiers, n_folds=None):
+    """ Splits participants into contiguous folds.
+
+    Parameters
+    ----------
+    identifiers : list
+        Participant identifiers.
+
+    n_folds : int, optional
+        Number of folds. If not given, each participant forms a fold
+        (leave-one-participant-out).
+
+    Returns
+    -------
+    list(list)
+        Identifiers of the held-out participants of each fold.
+
+    """
+    if n_folds is None:
+        return [[x] for x in identifiers]
+    return [list(x) for x in np.array_split(np.array(identifiers, dtype=object), n_folds) if len(x)]
+
+def fit_folds(model, dataset, n_folds=None):
+    """ Fits a copy of the model for each fold by subtracting the counts of the
+    held-out participants from the counts of the whole dataset.
+
+    Parameters
+    ----------
+    model : ccobra.CCobraModel
+        Model providing fit_counts (belief models and portfolios).
+
+    dataset : dict
+        Dictionary mapping participant identifiers to lists of task
+        dictionaries (see parallel.load_dataset).
+
+    n_folds : int, optional
+        Number of folds, see make_folds.
+
+    Returns
+    -------
+    list(tuple(list, ccobra.CCobraModel))
+        Held-out participants and the model fitted on the remaining
+        participants for each fold.
+
+    """
+    person_counts = participant_counts(dataset)
+    total_responses = sum(x[0] for x in person_counts.values())
+    total_ratings = sum(x[1] for x in person_counts.values())
+
+    population = copy.deepcopy(model)
+    population.fit_counts(total_responses, total_ratings)
+
+    result = []
+    for fold in make_folds(list(dataset), n_folds):
+        fold_model = copy.deepcopy(population)
+        fold_model.fit_counts(
+            -sum(person_counts[x][0] for x in fold),
+            -sum(person_counts[x][1] for x in fold),
+            warm_start=True)
+        result.append((fold, fold_model))
+    return result
+
+def run(model, dataset, n_folds=None, fit_person=False, seed=0):
+    """ Evaluates a model on each participant after fitting it to the
+    participants of the other folds.
+
+    Parameters
+    ----------
+    model : ccobra.CCobraModel
+        Model providing fit_counts (belief models and portfolios).
+
+    dataset : dict
+        Dictionary mapping participant identifiers to lists of task
+        dictionaries (see parallel.load_dataset).
+
+    n_folds : int, optional
+        Number of folds, see make_folds.
+
+    fit_person : bool
+        Whether the fold models are additionally fitted to the held-out
+        participant (pre_train_person) before the evaluation.
+
+    seed : int
+        Seed of the run, see parallel.participant_seeds.
+
+    Returns
+    -------
+    tuple(pd.DataFrame, dict)
+        Result rows ordered by participant (in dataset order) and sequence, and
+        dictionary mapping participant identifiers to their model logs.
+
+    """
+    seeds = parallel.participant_seeds(list(dataset), seed)
+
+    results = {}
+    for fold, fold_model in fit_folds(model, dataset, n_folds):
+        for ident in fold:
+            results[ident] = parallel.evaluate_participant(
+                fold_model, ident, dataset[ident], seeds[ident], fit_person=fit_person)
+
+    rows = [row for ident in dataset for row in results[ident][0]]
+    model_logs = {ident: results[ident][1] for ident in dataset}
+    return pd.DataFrame(rows), model_logs
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python crossval.py data.csv [model] [n_folds]")
+        sys.exit(1)
+
+    model_name = sys.argv[2] if len(sys.argv) > 2 else "portfolio"
+    n_folds = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    result_df, _ = run(MODELS[model_name](), parallel.load_dataset(sys.argv[1]), n_folds=n_folds)
+    print(result_df[['score_response', 'score_rating']].mean())
@@ -0,0 +1,50 @@
+import functools
+
+import ccobra
+
+import profiling
+
+
+SYLLOGISMS = ccobra.syllogistic.SYLLOGISMS
+RESPONSES = ccobra.syllogistic.RESPONSES
+SYLLOGISM_INDEX = {x: idx for idx, x in enumerate(SYLLOGISMS)}
+RESPONSE_INDEX = {x: idx for idx, x in enumerate(RESPONSES)}
+
+# Maximum number of distinct (task, choices) strings kept in the encoding cache
+CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def encode(task_str, choices_str):
+    """ Encodes a syllogistic verification task given in CCOBRA string
+    representation. Results are cached, so that parsing only happens once per
+    distinct task.
+
+    Parameters
+    ----------
+    task_str : str
+        Task string (e.g., 'All;A;B/Some;B;C').
+
+    choices_str : str
+        Choices string containing the conclusion to verify (e.g., 'All;A;C').
+
+    Returns
+    -------
+    tuple(int, int)
+        Indices of the syllogism in SYLLOGISMS and the conclusion in RESPONSES.
+
+    """
+    item = ccobra.Item(0, 'syllogistic', task_str, 'verify', choices_str, 0)
+    enc_syllogism = ccobra.syllogistic.encode_task(item.task)
+    enc_conclusion = ccobra.syllogistic.encode_response(item.choices[0], item.task)
+    return SYLLOGISM_INDEX[enc_syllogism], RESPONSE_INDEX[enc_conclusion]
+
+profiling.register_cache('encoding.encode', encode.cache_info)
+
+def encode_item(item):
+    """ Returns the (syllogism, conclusion) indices of a CCOBRA item (see encode). """
+    return encode(item.task_str, item.choices_str)
+
+def encode_item_str(item):
+    """ Returns the (syllogism, conclusion) encodings of a CCOBRA item (e.g., ('AA1', 'Aac')). """
+    idx_syl, idx_concl = encode(item.task_str, item.choices_str)
+    return SYLLOGISMS[idx_syl], RESPONSES[idx_concl]
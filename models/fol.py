@@ -3,6 +3,8 @@ import itertools
 import numpy as np
 import ccobra
 
+import profiling
+
 
 # the basic objects are defined here for convenience and better readability
 A = "A"
@@ -10,6 +12,55 @@ B = "B"
 C = "C"
 all_terms = [A, B, C]
 
+# syllogisms and conclusions (NVC excluded) in CCOBRA order
+SYLLOGISMS = ccobra.syllogistic.SYLLOGISMS
+CONCLUSIONS = [x for x in ccobra.syllogistic.RESPONSES if x != "NVC"]
+SYLLOGISM_INDEX = {x: idx for idx, x in enumerate(SYLLOGISMS)}
+CONCLUSION_INDEX = {x: idx for idx, x in enumerate(CONCLUSIONS)}
+
+# term pairs (subject, object) of both premises for each figure
+FIGURES = {
+    1: ((A, B), (B, C)),
+    2: ((B, A), (C, B)),
+    3: ((A, B), (C, B)),
+    4: ((B, A), (B, C)),
+}
+
+# bitmask engine: every region of the venn diagram is a bit, every world a 7-bit integer
+TERM_BITS = {A: 1, B: 2, C: 4}
+ALL_REGIONS = 0b1111111
+WORLD_MASKS = np.arange(ALL_REGIONS + 1, dtype=np.uint8)
+
+def _conclusion_masks():
+    need = []
+    forbid = []
+    for conclusion in CONCLUSIONS:
+        subj, obj = (A, C) if conclusion.endswith("ac") else (C, A)
+        regions = [x for x in range(1, 2**len(all_terms)) if TERM_BITS[subj] & x]
+        with_obj = sum(1 << (x - 1) for x in regions if TERM_BITS[obj] & x)
+        without_obj = sum(1 << (x - 1) for x in regions if not TERM_BITS[obj] & x)
+
+        # a world satisfies a conclusion iff it contains a region of need and none of forbid
+        quant = conclusion[0]
+        if quant == "A":
+            need.append(with_obj | without_obj)
+            forbid.append(without_obj)
+        elif quant == "E":
+            need.append(with_obj | without_obj)
+            forbid.append(with_obj)
+        elif quant == "I":
+            need.append(with_obj)
+            forbid.append(0)
+        elif quant == "O":
+            need.append(without_obj)
+            forbid.append(0)
+    return np.array(need, dtype=np.uint8), np.array(forbid, dtype=np.uint8)
+
+CONCLUSION_NEED, CONCLUSION_FORBID = _conclusion_masks()
+
+# (possible, necessary) for every syllogism and conclusion, see get_verdict_table
+_verdict_table = None
+
 
 def int_to_bools(num, digits):
     """ Converts an integer to an array of bools of its binary representation.
@@ -395,6 +446,135 @@ def get_conclusions_for_syllog(syl):
     return conclusions_dict
 
 
+def region_bit(terms):
+    """ Returns the bit of the venn diagram region in which exactly the given
+    terms overlap. Regions are numbered like the masks used in create_world_set
+    (A = 1, B = 2, C = 4), so that region r is represented by bit r - 1.
+
+    Parameters
+    ----------
+    terms : list(str)
+        Terms of the region (e.g., [A, C]).
+
+    Returns
+    -------
+    int
+        Bit representing the region.
+
+    """
+    return 1 << (sum(TERM_BITS[x] for x in terms) - 1)
+
+
+def worlds_to_masks(worlds):
+    """ Converts worlds of the set-based engine to the bitmask representation.
+
+    Parameters
+    ----------
+    worlds : list(set(tuple(str)))
+        List of worlds as returned by create_world_set.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted array of unique 7-bit world masks (uint8).
+
+    """
+    masks = [sum(region_bit(x) for x in world) for world in worlds]
+    return np.unique(np.array(masks, dtype=np.uint8))
+
+
+def create_world_masks(syl):
+    """ Bitmask variant of create_world_set. Each world is a 7-bit integer in
+    which every bit denotes a non-empty region of the venn diagram.
+
+    Parameters
+    ----------
+    syl : str
+        Encoded syllogism (e.g., AA1), according to the encoding used in CCOBRA.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted array of unique world masks (uint8). Equals
+        worlds_to_masks(create_world_set(syl)).
+
+    """
+    (subj1, obj1), (subj2, obj2) = FIGURES[int(syl[2])]
+    p1_pos, p1_neg = get_premise_meanings(syl[0], subj1, obj1)
+    p2_pos, p2_neg = get_premise_meanings(syl[1], subj2, obj2)
+
+    # regions that must not exist and regions mentioned by the premises
+    negatives = 0
+    for neg in p1_neg + p2_neg:
+        negatives |= region_bit(neg)
+    mentioned = negatives
+    for pos in p1_pos + p2_pos:
+        for p_sub in pos:
+            mentioned |= region_bit(p_sub)
+
+    # combine one admissible region of each positive statement
+    worlds = np.zeros(1, dtype=np.uint8)
+    for pos in p1_pos + p2_pos:
+        options = np.array(
+            [region_bit(x) for x in pos if not region_bit(x) & negatives], dtype=np.uint8)
+        worlds = (worlds[:, None] | options[None, :]).ravel()
+
+    # regions without information can be added in every combination
+    additions = ALL_REGIONS & ~mentioned
+    subsets = WORLD_MASKS[(WORLD_MASKS & (ALL_REGIONS ^ additions)) == 0]
+    worlds = (worlds[:, None] | subsets[None, :]).ravel()
+
+    return np.unique(worlds)
+
+
+def check_conclusions_masks(worlds):
+    """ Bitmask variant of check_conclusion that checks all conclusions against
+    all worlds at once.
+
+    Parameters
+    ----------
+    worlds : np.ndarray
+        Array of world masks as returned by create_world_masks.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean array of shape (8, 2) containing (possible, necessary) for each
+        conclusion in CONCLUSIONS.
+
+    """
+    holds = ((worlds[None, :] & CONCLUSION_NEED[:, None]) != 0) & \
+        ((worlds[None, :] & CONCLUSION_FORBID[:, None]) == 0)
+    return np.stack([holds.any(axis=1), holds.all(axis=1)], axis=1)
+
+
+def get_verdict_table():
+    """ Returns the table of verdicts for all syllogisms and conclusions. The
+    table is built once per process on first access and shared afterwards.
+
+    Returns
+    -------
+    np.ndarray
+        Read-only boolean array of shape (64, 8, 2). The first axis follows
+        ccobra.syllogistic.SYLLOGISMS, the second the conclusions in
+        ccobra.syllogistic.RESPONSES (without NVC). The last axis holds
+        (possible, necessary).
+
+    """
+    global _verdict_table
+
+    if _verdict_table is None:
+        profiling.count('fol.verdict_table.miss')
+        table = np.zeros((len(SYLLOGISMS), len(CONCLUSIONS), 2), dtype=bool)
+        for idx_syl, syl in enumerate(SYLLOGISMS):
+            table[idx_syl] = check_conclusions_masks(create_world_masks(syl))
+        table.flags.writeable = False
+        _verdict_table = table
+    else:
+        profiling.count('fol.verdict_table.hit')
+    return _verdict_table
+
+
 def get_valid_responses(syl):
     """ Calculates the valid responses for the given syllogism. If there is no
     valid response, NVC is concluded.
@@ -410,26 +590,51 @@ def get_valid_responses(syl):
         List of valid responses.
 
     """
-    concls = get_conclusions_for_syllog(syl)
-    valids = [x for x, y in concls.items() if y[1]]
+    necessary = get_verdict_table()[SYLLOGISM_INDEX[syl], :, 1]
+    valids = [x for x, y in zip(CONCLUSIONS, necessary) if y]
     if not valids:
         return ["NVC"]
     return valids
 
 
 class FOL():
+    # Attributes holding tables shared by all instances (see registry.py)
+    SHARED_TABLES = ('table',)
+
     def __init__(self):
-        self.cache = {}
-        pass
+        self.load_tables()
+
+    def load_tables(self):
+        self.table = get_verdict_table()
+
+    def __getstate__(self):
+        # The table is shared and reloaded instead of being copied
+        state = self.__dict__.copy()
+        for name in self.SHARED_TABLES:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.load_tables()
 
     def fit(self, train_data):
         pass
 
+    def fit_incremental(self, train_data):
+        pass
+
+    def evaluate_all(self):
+        """ Returns (possible, necessary) as boolean arrays of shape (64, 9) for
+        all syllogisms and responses (NVC is never possible). """
+        verdicts = np.zeros((len(SYLLOGISMS), len(CONCLUSIONS) + 1, 2), dtype=bool)
+        verdicts[:, :len(CONCLUSIONS)] = self.table
+        return verdicts[..., 0], verdicts[..., 1]
+
+    @profiling.timed()
     def evaluate_conclusion(self, conclusion, syllogism):
-        if (conclusion, syllogism) not in self.cache:
-            possible, follows = evaluate_conclusion(conclusion, syllogism)
-            self.cache[(conclusion, syllogism)] = (possible, follows)
-            return possible, follows
-        else:
-            possible, follows = self.cache[(conclusion, syllogism)]
-            return possible, follows
+        if conclusion == "NVC":
+            return False, False
+
+        possible, follows = self.table[SYLLOGISM_INDEX[syllogism], CONCLUSION_INDEX[conclusion]]
+        return bool(possible), bool(follows)
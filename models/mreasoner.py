@@ -1,15 +1,145 @@
+import os
+
 import numpy as np
 import ccobra
 
+import counts
+import encoding
+import profiling
+
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'caches')
+CACHE_NECESSARY = os.path.join(CACHE_DIR, 'necessary.npy')
+CACHE_POSSIBLE = os.path.join(CACHE_DIR, 'possible.npy')
+CACHE_PACKED = os.path.join(CACHE_DIR, 'packed.npz')
+
+# Axes of the caches and the threshold above which a conclusion is possible/necessary
+CACHE_AXES = ['epsilon', 'lambda', 'omega', 'sigma', 'syllogism', 'response']
+THRESHOLD = 0.5
+
+# Caches loaded by this process, see load_cache and load_packed_caches
+_loaded_caches = {}
+
+def load_cache(path):
+    """ Loads an mReasoner cache. Each file is memory-mapped only once per process
+    and shared by all MReasoner instances. As the pages are backed by the file,
+    they are also shared with other processes mapping the same cache.
+
+    Parameters
+    ----------
+    path : str
+        Path to the cache file (.npy).
+
+    Returns
+    -------
+    np.ndarray
+        Read-only view of the cache.
+
+    """
+    path = os.path.abspath(path)
+    if path not in _loaded_caches:
+        profiling.count('mreasoner.cache.miss')
+        _loaded_caches[path] = np.load(path, mmap_mode='r')
+    else:
+        profiling.count('mreasoner.cache.hit')
+
+    view = _loaded_caches[path].view(np.ndarray)
+    view.flags.writeable = False
+    return view
+
+def pack_caches(necessary_path=CACHE_NECESSARY, possible_path=CACHE_POSSIBLE, packed_path=CACHE_PACKED):
+    """ Converts the float caches into the compact format. Values are thresholded
+    and the resulting bits are packed along the response axis, so that each
+    (parameters, syllogism) entry occupies two bytes.
+
+    Parameters
+    ----------
+    necessary_path : str
+        Path to the cache of necessary conclusions (.npy).
+
+    possible_path : str
+        Path to the cache of possible conclusions (.npy).
+
+    packed_path : str
+        Path of the resulting file (.npz).
+
+    """
+    necessary = np.load(necessary_path, mmap_mode='r')
+    possible = np.load(possible_path, mmap_mode='r')
+    assert necessary.shape == possible.shape, 'Incompatible caches'
+
+    np.savez_compressed(
+        packed_path,
+        necessary=np.packbits(necessary >= THRESHOLD, axis=-1),
+        possible=np.packbits(possible >= THRESHOLD, axis=-1),
+        shape=np.array(necessary.shape),
+        axes=np.array(CACHE_AXES),
+        threshold=THRESHOLD
+    )
+
+def load_packed_caches(path):
+    """ Loads the compact cache format created by pack_caches once per process.
+
+    Parameters
+    ----------
+    path : str
+        Path to the packed caches (.npz).
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+        Read-only packed caches of necessary and possible conclusions.
+
+    """
+    path = os.path.abspath(path)
+    if path not in _loaded_caches:
+        profiling.count('mreasoner.cache.miss')
+        with np.load(path) as data:
+            assert list(data['axes']) == CACHE_AXES, 'Unknown cache layout'
+            assert data['shape'][-1] == len(ccobra.syllogistic.RESPONSES), 'Unknown cache layout'
+
+            caches = (data['necessary'], data['possible'])
+            for cache in caches:
+                cache.flags.writeable = False
+            _loaded_caches[path] = caches
+    else:
+        profiling.count('mreasoner.cache.hit')
+    return _loaded_caches[path]
+
+def threshold(cache, packed):
+    """ Converts (a slice of) a cache to booleans.
 
-CACHE_NECESSARY = 'caches/necessary.npy'
-CACHE_POSSIBLE = 'caches/possible.npy'
+    Parameters
+    ----------
+    cache : np.ndarray
+        Float cache or packed cache (with the response axis last).
+
+    packed : bool
+        Flag indicating whether the cache is packed.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean array indicating which conclusions are possible/necessary.
+
+    """
+    if packed:
+        return np.unpackbits(cache, axis=-1, count=len(ccobra.syllogistic.RESPONSES)).view(bool)
+    return cache >= THRESHOLD
+
+def relative_frequencies(task_counts):
+    """ Normalizes (rejection, acceptance) counts of shape (n, 2) to relative
+    frequencies. Tasks without responses have frequencies of zero. """
+    totals = task_counts.sum(axis=-1, keepdims=True)
+    return np.divide(task_counts, totals, out=np.zeros(task_counts.shape), where=totals > 0)
 
 class MReasoner():
+    # Attributes holding tables shared by all instances (see registry.py)
+    SHARED_TABLES = ('cache_necessary', 'cache_possible')
+
     def __init__(self):
         # Load mReasoner cache
-        self.cache_necessary = np.load(CACHE_NECESSARY)
-        self.cache_possible = np.load(CACHE_POSSIBLE)
+        self.load_caches()
 
         # Initialize parameters
         self.idx_epsilon = 0
@@ -19,46 +149,116 @@ class MReasoner():
 
         self.n_epsilon, self.n_lambda, self.n_omega, self.n_sigma = self.cache_necessary.shape[:-2]
 
+        # Sufficient statistics of the data fitted so far
+        self.counts = None
+        self.raw_scores = None
+        self.scores = None
+
+    def load_caches(self):
+        # Prefer the compact format if it has been created
+        self.packed = os.path.isfile(CACHE_PACKED)
+        if self.packed:
+            self.cache_necessary, self.cache_possible = load_packed_caches(CACHE_PACKED)
+        else:
+            self.cache_necessary = load_cache(CACHE_NECESSARY)
+            self.cache_possible = load_cache(CACHE_POSSIBLE)
+
+    def __getstate__(self):
+        # Caches are shared and reloaded from the registry instead of being copied
+        state = self.__dict__.copy()
+        for name in self.SHARED_TABLES:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.load_caches()
+
     def fit(self, train_data):
-        best_parameters = [0, 0, 0, 0]
-        best_value = -1
-
-        for idx_epsilon in range(self.n_epsilon):
-            for idx_lambda in range(self.n_lambda):
-                for idx_omega in range(self.n_omega):
-                    for idx_sigma in range(self.n_epsilon):
-                        # Obtain values
-                        is_necessary = self.cache_necessary[
-                            idx_epsilon, idx_lambda, idx_omega, idx_sigma]
-
-                        # Evaluate stuff
-                        score = 0
-                        for key, val in train_data.items():
-                            syl, concl = key
-                            idx_syl = ccobra.syllogistic.SYLLOGISMS.index(syl)
-                            idx_concl = ccobra.syllogistic.RESPONSES.index(concl)
-                            necc = is_necessary[idx_syl, idx_concl]
-
-                            score += val[int(necc < 0.5)] / np.sum(val)
-                        score /= len(train_data)
-
-                        if score > best_value:
-                            best_parameters = [idx_epsilon, idx_lambda, idx_omega, idx_sigma]
-                            best_value = score
-
-        self.idx_epsilon, self.idx_lambda, self.idx_omega, self.idx_sigma = best_parameters
+        """ Selects the parameters whose necessary conclusions best match the
+        relative acceptance frequencies of the training data.
+
+        Parameters
+        ----------
+        train_data : dict((str, str), list(int)) or np.ndarray
+            Training data as dictionary or (64, 9, 2) count tensor (see counts.py).
+
+        Returns
+        -------
+        np.ndarray
+            Scores of all parameter combinations with shape
+            (n_epsilon, n_lambda, n_omega, n_sigma).
+
+        """
+        self.counts = None
+        return self.fit_incremental(train_data)
+
+    @profiling.timed()
+    def fit_incremental(self, train_data):
+        """ Adds training data to the data fitted so far and reselects the
+        parameters. Only the scores of the tasks contained in the new data are
+        updated.
+
+        Parameters
+        ----------
+        train_data : dict((str, str), list(int)) or np.ndarray
+            Training data as dictionary or (64, 9, 2) count tensor (see counts.py).
+
+        Returns
+        -------
+        np.ndarray
+            Scores of all parameter combinations with shape
+            (n_epsilon, n_lambda, n_omega, n_sigma).
+
+        """
+        train_counts = counts.as_tensor(train_data)
+        if self.counts is None:
+            self.counts = np.zeros(train_counts.shape, dtype=np.int64)
+            self.raw_scores = np.zeros(self.cache_necessary.shape[:-2])
+
+        # Relative frequencies of rejections and acceptances before and after adding the data
+        idx_syl, idx_concl = np.nonzero(train_counts.sum(axis=-1))
+        old_counts = self.counts[idx_syl, idx_concl]
+        new_counts = old_counts + train_counts[idx_syl, idx_concl]
+        delta = relative_frequencies(new_counts) - relative_frequencies(old_counts)
+
+        # Necessary conclusions are scored by rejections, all others by acceptances
+        token = profiling.start()
+        is_necessary = threshold(
+            self.cache_necessary[..., idx_syl, :], self.packed)[..., np.arange(len(idx_syl)), idx_concl]
+        self.raw_scores += delta[:, 1].sum() + np.einsum(
+            '...i,i->...', is_necessary, delta[:, 0] - delta[:, 1])
+        profiling.stop('MReasoner.score', token)
+        profiling.count('MReasoner.combinations', self.raw_scores.size)
+
+        self.counts[idx_syl, idx_concl] = new_counts
+        scores = self.raw_scores / max(np.count_nonzero(self.counts.sum(axis=-1)), 1)
+
+        best_parameters = np.unravel_index(np.argmax(scores), scores.shape)
+        self.idx_epsilon, self.idx_lambda, self.idx_omega, self.idx_sigma = \
+            [int(x) for x in best_parameters]
+        self.scores = scores
+        return scores
+
+    def evaluate_all(self):
+        """ Returns (possible, necessary) as boolean arrays of shape (64, 9) for
+        the current parameters. """
+        params = (self.idx_epsilon, self.idx_lambda, self.idx_omega, self.idx_sigma)
+        return threshold(self.cache_possible[params], self.packed), \
+            threshold(self.cache_necessary[params], self.packed)
 
+    @profiling.timed()
     def evaluate_conclusion(self, conclusion, syllogism):
         # Obtain indices
-        idx_syl = ccobra.syllogistic.SYLLOGISMS.index(syllogism)
-        idx_concl = ccobra.syllogistic.RESPONSES.index(conclusion)
+        idx_syl = encoding.SYLLOGISM_INDEX[syllogism]
+        idx_concl = encoding.RESPONSE_INDEX[conclusion]
 
-        is_possible = self.cache_possible[
-            self.idx_epsilon, self.idx_lambda, self.idx_omega, self.idx_sigma, idx_syl, idx_concl
-        ]
+        params = (self.idx_epsilon, self.idx_lambda, self.idx_omega, self.idx_sigma, idx_syl)
+        is_possible = threshold(self.cache_possible[params], self.packed)[idx_concl]
+        is_necessary = threshold(self.cache_necessary[params], self.packed)[idx_concl]
 
-        is_necessary = self.cache_necessary[
-            self.idx_epsilon, self.idx_lambda, self.idx_omega, self.idx_sigma, idx_syl, idx_concl
-        ]
+        return is_possible, is_necessary
 
-        return is_possible >= 0.5, is_necessary >= 0.5
+if __name__ == '__main__':
+    pack_caches()
+    print('Packed caches written to {}'.format(CACHE_PACKED))
@@ -0,0 +1,209 @@
+""" Parallel per-participant fitting and evaluation of the portfolio models.
+
+Participants are distributed over a process pool. Each worker receives the
+(pre-trained) model once and evaluates its participants on deep copies, as the
+CCOBRA evaluator does. Prediction tables are built before the pool is created
+and the mReasoner caches are memory-mapped, so that workers share them instead
+of rebuilding them. Each participant gets its own random stream derived from
+the seed, which makes results independent of the number of workers and of the
+order in which participants are scheduled.
+
+Usage: python parallel.py data.csv [model] [n_jobs]
+
+"""
+
+import copy
+import multiprocessing
+import random
+import sys
+
+import ccobra
+import numpy as np
+import pandas as pd
+
+import columnar
+import fol
+import phm
+
+import portfolio
+import portfolio_belief
+
+# Fields of the model log reported by the portfolio models
+MODEL_LOG_FIELDS = ["syl_model", "belief_model"]
+
+MODELS = {
+    "portfolio": portfolio.Portfolio,
+    "portfolio_belief": portfolio_belief.BeliefPortfolio
+}
+
+# Model evaluated by the current worker process, see init_worker
+_worker_model = None
+
+def load_dataset(path):
+    """ Loads a CCOBRA dataset (e.g., data/Trippas2018.csv or its columnar
+    version data/Trippas2018.cols, see columnar.py) as dictionary mapping
+    participant identifiers to lists of task dictionaries.
+
+    """
+    if columnar.is_columnar(path):
+        return columnar.load(path).to_eval_dict()
+
+    data = ccobra.CCobraData(pd.read_csv(path), target_columns=['response', 'rating'])
+    return data.to_eval_dict()
+
+def participant_seeds(identifiers, seed):
+    """ Derives an independent seed for each participant from a common seed.
+
+    Parameters
+    ----------
+    identifiers : list
+        Participant identifiers in evaluation order.
+
+    seed : int
+        Seed of the whole run.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping identifiers to 32-bit seeds.
+
+    """
+    streams = np.random.SeedSequence(seed).spawn(len(identifiers))
+    return {ident: int(stream.generate_state(1)[0]) for ident, stream in zip(identifiers, streams)}
+
+def init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+    # Only builds the tables if the worker does not inherit them from the parent
+    phm.get_tables()
+    fol.get_verdict_table()
+
+def evaluate_participant(model, identifier, data, seed, fit_person=True):
+    """ Fits a copy of the model to a participant and evaluates it on the
+    participant's tasks.
+
+    Parameters
+    ----------
+    model : ccobra.CCobraModel
+        (Pre-trained) model. The model itself is not modified.
+
+    identifier : int
+        Participant identifier.
+
+    data : list(dict)
+        Task dictionaries of the participant (see load_dataset).
+
+    seed : int
+        Seed of the participant's random stream.
+
+    fit_person : bool
+        Whether the model is fitted to the participant's data (pre_train_person)
+        before the evaluation.
+
+    Returns
+    -------
+    tuple(list(dict), dict)
+        Result rows (one per task) in the format of the CCOBRA result files and
+        the model log of the participant.
+
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+
+    model = copy.deepcopy(model)
+    model.start_participant(id=identifier)
+    if fit_person:
+        model.pre_train_person(data)
+
+    rows = []
+    for task in data:
+        item = task['item']
+        prediction = model.predict(item, **task['aux'])
+        prediction_rating = model.predict_rating(item, **task['aux'])
+        rows.append({
+            'model': model.name,
+            'id': identifier,
+            'domain': item.domain,
+            'response_type': item.response_type,
+            'sequence': item.sequence_number,
+            'task': item.task_str,
+            'choices': item.choices_str,
+            'truth': task['response'],
+            'prediction': prediction,
+            'score_response': float(prediction == task['response']),
+            'truth_rating': task['rating'],
+            'prediction_rating': prediction_rating,
+            'score_rating': float(abs(prediction_rating - task['rating']))
+        })
+
+    model_log = {}
+    model.end_participant(identifier, model_log)
+    return rows, {x: model_log[x] for x in MODEL_LOG_FIELDS if x in model_log}
+
+def _evaluate_job(job):
+    return evaluate_participant(_worker_model, *job)
+
+def run(model, dataset, pre_train_data=None, n_jobs=None, seed=0):
+    """ Fits and evaluates a model for all participants of a dataset in
+    parallel.
+
+    Parameters
+    ----------
+    model : ccobra.CCobraModel
+        Model to evaluate (e.g., portfolio.Portfolio).
+
+    dataset : dict
+        Dictionary mapping participant identifiers to lists of task
+        dictionaries (see load_dataset).
+
+    pre_train_data : dict, optional
+        Data the model is pre-trained on before fitting the participants.
+
+    n_jobs : int, optional
+        Number of worker processes. Defaults to the number of CPUs, 1 evaluates
+        all participants in the current process.
+
+    seed : int
+        Seed of the run.
+
+    Returns
+    -------
+    tuple(pd.DataFrame, dict)
+        Result rows ordered by participant (in dataset order) and sequence, and
+        dictionary mapping participant identifiers to their model logs.
+
+    """
+    if pre_train_data is not None:
+        model.pre_train(list(pre_train_data.values()))
+
+    # Build the shared tables once, so that forked workers inherit them
+    phm.get_tables()
+    fol.get_verdict_table()
+
+    identifiers = list(dataset)
+    seeds = participant_seeds(identifiers, seed)
+    jobs = [(ident, dataset[ident], seeds[ident]) for ident in identifiers]
+
+    if n_jobs == 1:
+        results = [evaluate_participant(model, *job) for job in jobs]
+    else:
+        with multiprocessing.Pool(n_jobs, initializer=init_worker, initargs=(model,)) as pool:
+            # map returns the results in job order regardless of scheduling
+            results = pool.map(_evaluate_job, jobs, chunksize=1)
+
+    rows = [row for participant_rows, _ in results for row in participant_rows]
+    model_logs = {ident: log for ident, (_, log) in zip(identifiers, results)}
+    return pd.DataFrame(rows), model_logs
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python parallel.py data.csv [model] [n_jobs]")
+        sys.exit(1)
+
+    model_name = sys.argv[2] if len(sys.argv) > 2 else "portfolio"
+    n_jobs = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    result_df, logs = run(MODELS[model_name](), load_dataset(sys.argv[1]), n_jobs=n_jobs)
+    print(result_df[['score_response', 'score_rating']].mean())
+    print(pd.DataFrame.from_dict(logs, orient='index').value_counts())
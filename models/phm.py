@@ -1,57 +1,265 @@
+import functools
+import itertools
+
 import numpy as np
 import ccobra
 
+import counts
+import encoding
+import profiling
 import helpers.phm as phmhelper
 
+# Parameter grids for p-entailment and the max-heuristic confidences
+P_ENTAILMENT_GRID = [1, 0]
+MAX_CONFIDENCE_GRID = [
+    {'A': 1, 'I': 1, 'E': 1, 'O': 1},
+    {'A': 1, 'I': 1, 'E': 1, 'O': 0},
+    {'A': 1, 'I': 1, 'E': 0, 'O': 1},
+    {'A': 1, 'I': 1, 'E': 0, 'O': 0},
+    {'A': 1, 'I': 0, 'E': 0, 'O': 0},
+    {'A': 0, 'I': 0, 'E': 0, 'O': 0}
+]
+
+# Quantifier of the max-premise of each syllogism
+MAX_PREMISES = [phmhelper.max_premise(x) for x in encoding.SYLLOGISMS]
+
+# Order of the quantifiers in confidence vectors
+QUANTIFIERS = ['A', 'I', 'E', 'O']
+MAX_PREMISE_INDICES = np.array([QUANTIFIERS.index(x) for x in MAX_PREMISES])
+
+# Prediction tables shared by all PHM instances, see get_tables
+_tables = None
+
+def get_tables():
+    """ Returns the PHM prediction tables. The tables are built once per process
+    on first access.
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+        Read-only boolean tables. The first has shape (2, 64, 9) and indicates
+        whether a conclusion is generated for a syllogism without (0) or with (1)
+        p-entailment. The second has shape (6, 64) and contains the result of
+        the max-heuristic for each entry of MAX_CONFIDENCE_GRID and syllogism.
+
+    """
+    global _tables
+
+    if _tables is None:
+        phm_inst = phmhelper.PHM()
+
+        conclusions = np.zeros((2, len(encoding.SYLLOGISMS), len(encoding.RESPONSES)), dtype=bool)
+        for p_ent in [0, 1]:
+            for idx_syl, syl in enumerate(encoding.SYLLOGISMS):
+                for concl in phm_inst.generate_conclusions(syl, p_ent):
+                    conclusions[p_ent, idx_syl, encoding.RESPONSE_INDEX[concl]] = True
+
+        max_heuristic = np.zeros((len(MAX_CONFIDENCE_GRID), len(encoding.SYLLOGISMS)), dtype=bool)
+        for idx_conf, max_conf in enumerate(MAX_CONFIDENCE_GRID):
+            confs = [max_conf[x] for x in ['A', 'I', 'E', 'O']]
+            for idx_syl, syl in enumerate(encoding.SYLLOGISMS):
+                max_heuristic[idx_conf, idx_syl] = phm_inst.max_heuristic(syl, *confs)
+
+        conclusions.flags.writeable = False
+        max_heuristic.flags.writeable = False
+        _tables = (conclusions, max_heuristic)
+    return _tables
+
 class PHM():
+    # Attributes holding tables shared by all instances (see registry.py)
+    SHARED_TABLES = ('conclusions', 'max_heuristic')
+
     def __init__(self):
         # Initialize parameters
         self.p_entailment = False
         self.max_confidence = {'A': 1, 'I': 0, 'E': 0, 'O': 0}
 
-        self.phm_inst = phmhelper.PHM()
+        self.load_tables()
+
+        # Sufficient statistics of the data fitted so far
+        self.counts = None
+        self.raw_scores = None
+        self.scores = None
+
+    def load_tables(self):
+        self.conclusions, self.max_heuristic = get_tables()
+
+    def __getstate__(self):
+        # Tables are shared and reloaded instead of being copied
+        state = self.__dict__.copy()
+        for name in self.SHARED_TABLES:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.load_tables()
+
+    @profiling.timed()
+    def score(self, train_counts, max_heuristic):
+        """ Scores all combinations of p-entailment and max-heuristic results.
+
+        Parameters
+        ----------
+        train_counts : np.ndarray
+            Count tensor of shape (64, 9, 2) (see counts.py).
+
+        max_heuristic : np.ndarray
+            Boolean array of shape (k, 64) containing the max-heuristic results of
+            k confidence settings.
+
+        Returns
+        -------
+        np.ndarray
+            Number of matching responses of shape (2, k) for using p-entailment
+            (first row) or not.
+
+        """
+        rejected = train_counts[..., 0]
+        accepted = train_counts[..., 1]
+        profiling.count('PHM.combinations', len(P_ENTAILMENT_GRID) * len(max_heuristic))
+
+        # Necessary conclusions for every parameter combination (p-entailment tried first)
+        is_necessary = self.conclusions[P_ENTAILMENT_GRID][:, None] & max_heuristic[None, :, :, None]
+
+        # Necessary conclusions are scored by acceptances, all others by rejections
+        return rejected.sum() + is_necessary.reshape(
+            len(P_ENTAILMENT_GRID), len(max_heuristic), -1) @ (accepted - rejected).ravel()
+
+    def candidates(self):
+        """ Returns the max-heuristic results of the confidence settings, see score. """
+        return self.max_heuristic
+
+    def set_parameters(self, idx_p_ent, idx_conf):
+        self.p_entailment = P_ENTAILMENT_GRID[idx_p_ent]
+        self.max_confidence = MAX_CONFIDENCE_GRID[idx_conf]
 
     def fit(self, train_data):
-        best = None
-        best_score = -1
-
-        # Iterate over parameters
-        max_confidence_grid = [
-            {'A': 1, 'I': 1, 'E': 1, 'O': 1},
-            {'A': 1, 'I': 1, 'E': 1, 'O': 0},
-            {'A': 1, 'I': 1, 'E': 0, 'O': 1},
-            {'A': 1, 'I': 1, 'E': 0, 'O': 0},
-            {'A': 1, 'I': 0, 'E': 0, 'O': 0},
-            {'A': 0, 'I': 0, 'E': 0, 'O': 0}
-        ]
-
-        # Prepare the optimization loop
-        for p_ent in [1, 0]:
-            for max_conf in max_confidence_grid:
-                self.p_entailment = p_ent
-                self.max_confidence = max_conf
-
-                score = 0
-                for key, val in train_data.items():
-                    syl, concl = key
-                    possible, necessary = self.evaluate_conclusion(concl, syl)
-                    score += val[int(necessary)]
-
-                score /= len(train_data)
-
-                if  score > best_score:
-                    best_score = score
-                    best = (p_ent, max_conf)
-
-        self.p_entailment, self.max_confidence = best
+        self.counts = None
+        return self.fit_incremental(train_data)
+
+    @profiling.timed()
+    def fit_incremental(self, train_data):
+        """ Adds training data to the data fitted so far and reselects the
+        parameters. As the scores are sums over responses, the scores of the new
+        data are simply added. """
+        train_counts = counts.as_tensor(train_data)
+        if self.counts is None:
+            self.counts = np.zeros(train_counts.shape, dtype=np.int64)
+            self.raw_scores = 0
+
+        self.counts += train_counts
+        self.raw_scores = self.raw_scores + self.score(train_counts, self.candidates())
+        scores = self.raw_scores / max(np.count_nonzero(self.counts.sum(axis=-1)), 1)
+
+        self.set_parameters(*np.unravel_index(np.argmax(scores), scores.shape))
+        self.scores = scores
+        return scores
 
+    def evaluate_all(self):
+        """ Returns (possible, necessary) as boolean arrays of shape (64, 9) for
+        the current parameters. """
+        possible = self.conclusions[int(self.p_entailment)]
+        max_conf = np.array([self.max_confidence[x] for x in QUANTIFIERS])[MAX_PREMISE_INDICES]
+        return possible, possible & (max_conf >= 0.5)[:, None]
+
+    @profiling.timed()
     def evaluate_conclusion(self, conclusion, syllogism):
-        preds = self.phm_inst.generate_conclusions(syllogism, self.p_entailment)
+        idx_syl = encoding.SYLLOGISM_INDEX[syllogism]
 
-        if conclusion in preds:
-            if not self.phm_inst.max_heuristic(syllogism, *[self.max_confidence[x] for x in ['A', 'I', 'E', 'O']]):
+        if self.conclusions[int(self.p_entailment), idx_syl, encoding.RESPONSE_INDEX[conclusion]]:
+            if not self.max_confidence[MAX_PREMISES[idx_syl]] >= 0.5:
                 return True, False
             else:
                 return True, True
         else:
             return False, False
+
+@functools.lru_cache()
+def confidence_classes(step):
+    """ Partitions the confidence vectors on a grid that are ordered according to
+    A >= I >= E and A >= I >= O into classes with identical max-heuristic
+    decisions (i.e., identical confidences >= 0.5). Class sizes and means are
+    computed per I-confidence without enumerating the grid.
+
+    Parameters
+    ----------
+    step : float
+        Step size of the grid.
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray, np.ndarray)
+        Read-only decisions of shape (k, 4), number of grid points of shape (k,),
+        and mean confidences of shape (k, 4) of the non-empty classes.
+        Quantifiers follow the QUANTIFIERS order. The arrays are computed once
+        per step size and process.
+
+    """
+    values = np.round(np.arange(0, 1 + step / 2, step), 10)
+    high = values >= 0.5
+
+    # Per I-confidence: number and sum of admissible A (>= I) and E/O (<= I) confidences
+    # below (0) and above (1) the threshold
+    above = values[None, :] >= values[:, None]
+    below = values[None, :] <= values[:, None]
+    sides = np.stack([~high, high], axis=1)
+    cnt_a = above.astype(int) @ sides
+    sum_a = (above * values) @ sides
+    cnt_eo = below.astype(int) @ sides
+    sum_eo = (below * values) @ sides
+
+    # Axes: I-confidence, A decision, E decision, O decision
+    a_part = cnt_a[:, :, None, None]
+    e_part = cnt_eo[:, None, :, None]
+    o_part = cnt_eo[:, None, None, :]
+    sizes = a_part * e_part * o_part
+    sums = np.stack([
+        sum_a[:, :, None, None] * e_part * o_part,
+        values[:, None, None, None] * sizes,
+        a_part * sum_eo[:, None, :, None] * o_part,
+        a_part * e_part * sum_eo[:, None, None, :],
+    ], axis=-1)
+
+    decisions = []
+    class_sizes = []
+    class_means = []
+    for dec_a, dec_i, dec_e, dec_o in itertools.product([False, True], repeat=4):
+        size = sizes[high == dec_i, int(dec_a), int(dec_e), int(dec_o)].sum()
+        if size == 0:
+            continue
+
+        decisions.append([dec_a, dec_i, dec_e, dec_o])
+        class_sizes.append(size)
+        class_means.append(sums[high == dec_i, int(dec_a), int(dec_e), int(dec_o)].sum(axis=0) / size)
+
+    result = (np.array(decisions), np.array(class_sizes), np.array(class_means))
+    for arr in result:
+        arr.flags.writeable = False
+    return result
+
+class ContinuousPHM(PHM):
+    """ PHM variant fitting continuous max-heuristic confidences on a dense grid.
+    Predictions only depend on which confidences reach 0.5, so the grid is
+    partitioned into classes with identical decisions and only one decision
+    vector per class is scored. The fitted confidences are the mean of the best
+    class.
+
+    """
+
+    SHARED_TABLES = PHM.SHARED_TABLES + ('decisions', 'class_sizes', 'class_means')
+
+    def __init__(self, step=0.05):
+        self.step = step
+        super(ContinuousPHM, self).__init__()
+
+    def load_tables(self):
+        super(ContinuousPHM, self).load_tables()
+        self.decisions, self.class_sizes, self.class_means = confidence_classes(self.step)
+
+    def candidates(self):
+        return self.decisions[:, MAX_PREMISE_INDICES]
+
+    def set_parameters(self, idx_p_ent, idx_class):
+        self.p_entailment = P_ENTAILMENT_GRID[idx_p_ent]
+        self.max_confidence = dict(zip(QUANTIFIERS, self.class_means[idx_class].tolist()))
@@ -0,0 +1,204 @@
+import numpy as np
+import ccobra
+
+import fol
+
+
+def parse_premises(syllogism):
+    """ Converts a syllogism to a list of premises. CCOBRA encodings (e.g., AA1)
+    are decoded into their two premises over the terms A, B, and C, premise
+    lists are returned unchanged.
+
+    Parameters
+    ----------
+    syllogism : str or list(tuple(str, str, str))
+        Encoded syllogism (e.g., AA1) or list of premises, each consisting of
+        quantifier (A, E, I, O), subject, and object (e.g., ("A", "x", "y")).
+
+    Returns
+    -------
+    list(tuple(str, str, str))
+        List of premises.
+
+    """
+    if isinstance(syllogism, str):
+        (subj1, obj1), (subj2, obj2) = fol.FIGURES[int(syllogism[2])]
+        return [(syllogism[0], subj1, obj1), (syllogism[1], subj2, obj2)]
+    return [tuple(x) for x in syllogism]
+
+
+def parse_conclusion(conclusion):
+    """ Converts a conclusion to a (quantifier, subject, object) tuple.
+
+    Parameters
+    ----------
+    conclusion : str or tuple(str, str, str)
+        Encoded conclusion (e.g., Aac) or conclusion tuple.
+
+    Returns
+    -------
+    tuple(str, str, str)
+        Conclusion tuple.
+
+    """
+    if isinstance(conclusion, str):
+        if conclusion.endswith("ac"):
+            return (conclusion[0], fol.A, fol.C)
+        return (conclusion[0], fol.C, fol.A)
+    return tuple(conclusion)
+
+
+class RegionSpace():
+    """ Venn diagram over an arbitrary number of terms. Each non-empty region
+    is a bit of a python integer, so that sets of regions can be combined with
+    bit operations regardless of the number of terms.
+
+    """
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        n_regions = 2**len(self.terms) - 1
+
+        # regions r = 1 .. 2^N - 1 are represented by bit r - 1
+        self.term_masks = {}
+        for idx, term in enumerate(self.terms):
+            mask = 0
+            for region in range(1, n_regions + 1):
+                if region & (1 << idx):
+                    mask |= 1 << (region - 1)
+            self.term_masks[term] = mask
+
+    def statement(self, quant, subj, obj):
+        """ Translates a quantified statement into constraints on the regions.
+        The semantics follow fol.get_premise_meanings (premises) and
+        fol.check_conclusion_in_world (conclusions).
+
+        Parameters
+        ----------
+        quant : str
+            The quantifier (A = All, E = No, I = Some, O = Some not)
+
+        subj : str
+            The subject of the statement.
+
+        obj : str
+            The object of the statement.
+
+        Returns
+        -------
+        tuple(list(int), int, list(int), int)
+            Premise needs, premise forbidden regions, conclusion needs, and
+            conclusion forbidden regions. A need is a set of regions of which at
+            least one must be non-empty, forbidden regions must be empty.
+
+        """
+        subj_mask = self.term_masks[subj]
+        obj_mask = self.term_masks[obj]
+        both = subj_mask & obj_mask
+        subj_only = subj_mask & ~obj_mask
+        obj_only = obj_mask & ~subj_mask
+
+        if quant == "A":
+            return [both], subj_only, [subj_mask], subj_only
+        elif quant == "E":
+            return [subj_only, obj_only], both, [subj_mask], both
+        elif quant == "I":
+            return [both], 0, [both], 0
+        elif quant == "O":
+            return [subj_only], 0, [subj_only], 0
+        raise ValueError("Unknown quantifier '{}'".format(quant))
+
+
+def satisfiable(needs, forbidden):
+    """ Checks if there is a world fulfilling all constraints. As all constraints
+    are either forbidden regions or sets of regions of which one must be
+    non-empty, a model exists iff no need is completely forbidden.
+
+    Parameters
+    ----------
+    needs : list(int)
+        Sets of regions of which at least one must be non-empty.
+
+    forbidden : int
+        Set of regions that must be empty.
+
+    Returns
+    -------
+    bool
+        True, if a world fulfilling all constraints exists.
+
+    """
+    return all(x & ~forbidden for x in needs)
+
+
+def evaluate_conclusion(conclusion, premises):
+    """ Checks if a conclusion is possible given the premises or necessarily
+    follows from them. Instead of enumerating worlds, the (negated) conclusion
+    is added to the premise constraints, which are then checked for
+    satisfiability.
+
+    Parameters
+    ----------
+    conclusion : tuple(str, str, str)
+        Conclusion consisting of quantifier, subject, and object.
+
+    premises : list(tuple(str, str, str))
+        Premises consisting of quantifier, subject, and object.
+
+    Returns
+    -------
+    tuple(bool, bool)
+        A tuple containing two bools. The first bool is true if the conclusion
+        is possible given the premises, the second is true iff the conclusion
+        neccessarily follows.
+
+    """
+    terms = []
+    for _, subj, obj in list(premises) + [conclusion]:
+        for term in (subj, obj):
+            if term not in terms:
+                terms.append(term)
+    space = RegionSpace(terms)
+
+    needs = []
+    forbidden = 0
+    for premise in premises:
+        prem_needs, prem_forbidden, _, _ = space.statement(*premise)
+        needs.extend(prem_needs)
+        forbidden |= prem_forbidden
+
+    _, _, concl_needs, concl_forbidden = space.statement(*conclusion)
+    possible = satisfiable(needs + concl_needs, forbidden | concl_forbidden)
+
+    # the negated conclusion is fulfilled if a need is empty or a forbidden region exists
+    counterexample = any(satisfiable(needs, forbidden | x) for x in concl_needs)
+    if concl_forbidden:
+        counterexample = counterexample or satisfiable(needs + [concl_forbidden], forbidden)
+
+    return possible, not counterexample
+
+
+class PolyFOL():
+    def __init__(self):
+        pass
+
+    def fit(self, train_data):
+        pass
+
+    def fit_incremental(self, train_data):
+        pass
+
+    def evaluate_all(self):
+        """ Returns (possible, necessary) as boolean arrays of shape (64, 9) for
+        all syllogisms and responses in CCOBRA order. """
+        verdicts = np.array([
+            [self.evaluate_conclusion(concl, syl) for concl in ccobra.syllogistic.RESPONSES]
+            for syl in ccobra.syllogistic.SYLLOGISMS
+        ], dtype=bool)
+        return verdicts[..., 0], verdicts[..., 1]
+
+    def evaluate_conclusion(self, conclusion, syllogism):
+        if conclusion == "NVC":
+            return False, False
+
+        return evaluate_conclusion(parse_conclusion(conclusion), parse_premises(syllogism))
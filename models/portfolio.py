@@ -1,33 +1,38 @@
-import logging
-import time
-
 import ccobra
 import numpy as np
 
-import mreasoner
-import fol
-import phm
+import counts
+import encoding
+import profiling
+import registry
 
 import SelectiveScrutinyModel as ss
 import MisinterpretedNecessity as mn
 import NoBeliefModel as nobel
 
-logger = logging.getLogger(__name__)
+# Candidate models in the order in which they are tried
+SYL_MODELS = ["fol", "mreasoner", "phm"]
+BEL_MODELS = ["nobel", "mn", "ss"]
 
 class Portfolio(ccobra.CCobraModel):
-    def __init__(self, name='Portfolio', optimize_rating=False):
+    def __init__(self, name='Portfolio', optimize_rating=False, warm_start=False):
         super(Portfolio, self).__init__(name, ['syllogistic-belief'], ['verify'])
 
         self.selectivescrutiny = ss.SelectiveScrutinyRestr()
         self.misinterpretednecessity = mn.MisinterpretedNecessityRestr()
         self.nobelief = nobel.NoBeliefModel()
 
-        self.mreasoner = mreasoner.MReasoner()
-        self.phm = phm.PHM()
-        self.fol = fol.FOL()
+        self.mreasoner = registry.create("mReasoner")
+        self.phm = registry.create("phm")
+        self.fol = registry.create("fol")
         
         self.optimize_rating = optimize_rating
 
+        # Refit participants on top of the population data from pre_train
+        self.warm_start = warm_start
+        self.responses = None
+        self.ratings = None
+
         # Prepare members
         self.time_start = None
         
@@ -35,64 +40,60 @@ class Portfolio(ccobra.CCobraModel):
         self.optimal_belief_model = "nobel"
 
     def start_participant(self, **kwargs):
-            self.time_start = time.time()
+        self.time_start = profiling.start()
 
     def end_participant(self, identifier, model_log, **kwargs):
-        logger.info('End participant %d (%.2fs)', identifier, time.time() - self.time_start)
+        profiling.stop('Portfolio.participant', self.time_start)
         model_log["syl_model"] = self.optimal_syl_model
         model_log["belief_model"] = self.optimal_belief_model 
         
     def pre_train(self, dataset, **kwargs):
-        # Train method parameters based on verification response
-        train_data_response = {}
-        for dude_data in dataset:
-            for task_data in dude_data:
-                syl = ccobra.syllogistic.Syllogism(task_data['item'])
-                enc_syllogism = syl.encoded_task
-                enc_conclusion = syl.encode_response(task_data['item'].choices[0])
-
-                key = (enc_syllogism, enc_conclusion)
-                if key not in train_data_response:
-                    train_data_response[key] = [0, 0]
-                train_data_response[key][int(task_data['response'])] += 1
-
-        self.mreasoner.fit(train_data_response)
-        self.phm.fit(train_data_response)
-        self.fol.fit(train_data_response)
-        
+        self.fit_counts(*counts.from_dataset(dataset))
+
+    @profiling.timed()
+    def fit_counts(self, responses, ratings, warm_start=False):
+        # Train method parameters based on verification response. When warm
+        # starting, the counts are added to the data fitted before.
+        train_data_response = responses.sum(axis=2)
+        if warm_start and self.responses is not None:
+            self.responses = self.responses + responses
+            self.ratings = self.ratings + ratings
+            self.mreasoner.fit_incremental(train_data_response)
+            self.phm.fit_incremental(train_data_response)
+            self.fol.fit_incremental(train_data_response)
+        else:
+            self.responses = responses
+            self.ratings = ratings
+            self.mreasoner.fit(train_data_response)
+            self.phm.fit(train_data_response)
+            self.fol.fit(train_data_response)
+
         # find the best belief x syl model combination
-        best_score = 0
-        best_error = 9999
-        best_comb = ["fol", "nobel"]
-        for syl_model in ["fol", "mreasoner", "phm"]:
-            sm = self.get_syl_model(syl_model)
-
-            for bel_model in ["nobel", "mn", "ss"]:
-                bm = self.get_bel_model(bel_model)
-                bm.method = sm
-               
-                if self.optimize_rating:
-                    error = 0                
-                    for dude_data in dataset:
-                        for task_data in dude_data:
-                            pred = bm.predict_rating(task_data['item'], **task_data["full"])
-                            truth = task_data['rating']
-                            error += abs(pred - truth)
-                    if error < best_error:
-                        best_error = error
-                        best_comb = (syl_model, bel_model)
-                else:
-                    score = 0                
-                    for dude_data in dataset:
-                        for task_data in dude_data:
-                            pred = bm.predict(task_data['item'], **task_data["full"])
-                            truth = task_data['response']
-                            score += int(pred == truth)
-                    if score > best_score:
-                        best_score = score
-                        best_comb = (syl_model, bel_model)
-        self.optimal_syl_model = best_comb[0]
-        self.optimal_belief_model = best_comb[1]
+        token = profiling.start()
+        tables = self.rating_tables()
+        if self.optimize_rating:
+            scores = -counts.sum_abs_errors(tables, self.ratings)
+        else:
+            scores = counts.count_hits(tables > 3, self.responses)
+
+        idx_syl, idx_bel = np.unravel_index(np.argmax(scores), scores.shape)
+        profiling.stop('Portfolio.select', token)
+        profiling.count('Portfolio.combinations', scores.size)
+        self.optimal_syl_model = SYL_MODELS[idx_syl]
+        self.optimal_belief_model = BEL_MODELS[idx_bel]
+
+    def rating_tables(self):
+        """ Returns the ratings predicted by all syllogistic x belief model
+        combinations as array of shape (3, 3, 64, 9, 2) indexed by SYL_MODELS,
+        BEL_MODELS, syllogism, conclusion, and believability. """
+        tables = []
+        for syl_model in SYL_MODELS:
+            possible, necessary = self.get_syl_model(syl_model).evaluate_all()
+            tables.append([
+                self.get_bel_model(bel_model).RATINGS[possible.astype(int), necessary.astype(int)]
+                for bel_model in BEL_MODELS
+            ])
+        return np.array(tables)
 
     def get_syl_model(self, syl_model):
         if syl_model == "fol":
@@ -110,14 +111,36 @@ class Portfolio(ccobra.CCobraModel):
         else:
             return self.misinterpretednecessity
 
+    @profiling.timed()
     def pre_train_person(self, dataset, **kwargs):
-        self.pre_train([dataset])
+        if self.warm_start:
+            self.fit_counts(*counts.from_dataset([dataset]), warm_start=True)
+        else:
+            self.pre_train([dataset])
         
+    @profiling.timed()
     def predict(self, item, **kwargs):
         return self.predict_rating(item, **kwargs) > 3
 
+    @profiling.timed()
     def predict_rating(self, item, **kwargs):
+        enc_syllogism, enc_conclusion = encoding.encode_item_str(item)
         sm = self.get_syl_model(self.optimal_syl_model)
         bm = self.get_bel_model(self.optimal_belief_model)
-        bm.method = sm
-        return bm.predict_rating(item, **kwargs)
+
+        possible, necessary = sm.evaluate_conclusion(enc_conclusion, enc_syllogism)
+        bel = kwargs.get('is_believable', False)
+        return int(bm.RATINGS[int(possible), int(necessary), int(bel)])
+
+    @profiling.timed()
+    def predict_batch(self, idx_syl, idx_concl, is_believable):
+        return self.predict_rating_batch(idx_syl, idx_concl, is_believable) > 3
+
+    @profiling.timed()
+    def predict_rating_batch(self, idx_syl, idx_concl, is_believable):
+        sm = self.get_syl_model(self.optimal_syl_model)
+        bm = self.get_bel_model(self.optimal_belief_model)
+
+        possible, necessary = sm.evaluate_all()
+        table = bm.RATINGS[possible.astype(int), necessary.astype(int)]
+        return table[idx_syl, idx_concl, np.asarray(is_believable, dtype=int)]
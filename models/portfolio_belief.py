@@ -1,9 +1,8 @@
-import logging
-import time
-
 import ccobra
 import numpy as np
 
+import counts
+import profiling
 import mreasoner
 import fol
 import phm
@@ -12,10 +11,11 @@ import SelectiveScrutinyModel as ss
 import MisinterpretedNecessity as mn
 import NoBeliefModel as nobel
 
-logger = logging.getLogger(__name__)
+# Candidate belief models in the order in which they are tried
+BEL_MODELS = ["nobel", "mn", "ss"]
 
 class BeliefPortfolio(ccobra.CCobraModel):
-    def __init__(self, name='BeliefPortfolio', method='mReasoner', optimize_rating=False):
+    def __init__(self, name='BeliefPortfolio', method='mReasoner', optimize_rating=False, warm_start=False):
         super(BeliefPortfolio, self).__init__(name, ['syllogistic-belief'], ['verify'])
 
         self.selectivescrutiny = ss.SelectiveScrutinyRestr(method=method)
@@ -24,50 +24,61 @@ class BeliefPortfolio(ccobra.CCobraModel):
         self.optimal_belief_model = "nobel"
         self.optimize_rating = optimize_rating
 
+        # Refit participants on top of the population data from pre_train
+        self.warm_start = warm_start
+        self.responses = None
+        self.ratings = None
+
         # Prepare members
         self.time_start = None
 
     def start_participant(self, **kwargs):
-            self.time_start = time.time()
+        self.time_start = profiling.start()
 
     def end_participant(self, identifier, model_log, **kwargs):
-        logger.info('End participant %d (%.2fs)', identifier, time.time() - self.time_start)
+        profiling.stop('BeliefPortfolio.participant', self.time_start)
         model_log["belief_model"] = self.optimal_belief_model 
         
     def pre_train(self, dataset, **kwargs):
-        self.selectivescrutiny.pre_train(dataset, **kwargs)
-        self.misinterpretednecessity.pre_train(dataset, **kwargs)
-        self.nobelief.pre_train(dataset, **kwargs)
-
-        # find the best belief x syl model combination
-        best_score = 0
-        best_error = 9999
-        best = "nobel"
-        for bel_model in ["nobel", "mn", "ss"]:
+        self.fit_counts(*counts.from_dataset(dataset))
+
+    @profiling.timed()
+    def fit_counts(self, responses, ratings, warm_start=False):
+        # When warm starting, the counts are added to the data fitted before
+        warm_start = warm_start and self.responses is not None
+        if warm_start:
+            self.responses = self.responses + responses
+            self.ratings = self.ratings + ratings
+        else:
+            self.responses = responses
+            self.ratings = ratings
+
+        self.selectivescrutiny.fit_counts(responses, ratings, warm_start=warm_start)
+        self.misinterpretednecessity.fit_counts(responses, ratings, warm_start=warm_start)
+        self.nobelief.fit_counts(responses, ratings, warm_start=warm_start)
+
+        # find the best belief model
+        token = profiling.start()
+        tables = self.rating_tables()
+        if self.optimize_rating:
+            scores = -counts.sum_abs_errors(tables, self.ratings)
+        else:
+            scores = counts.count_hits(tables > 3, self.responses)
+
+        self.optimal_belief_model = BEL_MODELS[int(np.argmax(scores))]
+        profiling.stop('BeliefPortfolio.select', token)
+        profiling.count('BeliefPortfolio.combinations', scores.size)
+
+    def rating_tables(self):
+        """ Returns the ratings predicted by all belief models as array of shape
+        (3, 64, 9, 2) indexed by BEL_MODELS, syllogism, conclusion, and
+        believability. """
+        tables = []
+        for bel_model in BEL_MODELS:
             bm = self.get_bel_model(bel_model)
-           
-            if self.optimize_rating:
-                error = 0                
-                for dude_data in dataset:
-                    for task_data in dude_data:
-                        pred = bm.predict_rating(task_data['item'], **task_data["full"])
-                        truth = task_data['rating']
-                        error += abs(pred - truth)
-                if error < best_error:
-                    best_error = error
-                    best = bel_model
-            else:
-                score = 0                
-                for dude_data in dataset:
-                    for task_data in dude_data:
-                        pred = bm.predict(task_data['item'], **task_data["full"])
-                        truth = task_data['response']
-                        score += int(pred == truth)
-                if score > best_score:
-                    best_score = score
-                    best = bel_model
-
-        self.optimal_belief_model = best
+            possible, necessary = bm.method.evaluate_all()
+            tables.append(bm.RATINGS[possible.astype(int), necessary.astype(int)])
+        return np.array(tables)
 
     def get_bel_model(self, bel_model):
         if bel_model == "nobel":
@@ -77,12 +88,27 @@ class BeliefPortfolio(ccobra.CCobraModel):
         else:
             return self.misinterpretednecessity
 
+    @profiling.timed()
     def pre_train_person(self, dataset, **kwargs):
-        self.pre_train([dataset])
+        if self.warm_start:
+            self.fit_counts(*counts.from_dataset([dataset]), warm_start=True)
+        else:
+            self.pre_train([dataset])
         
+    @profiling.timed()
     def predict(self, item, **kwargs):
         return self.predict_rating(item, **kwargs) > 3
 
+    @profiling.timed()
     def predict_rating(self, item, **kwargs):
         bm = self.get_bel_model(self.optimal_belief_model)
         return bm.predict_rating(item, **kwargs)
+
+    @profiling.timed()
+    def predict_batch(self, idx_syl, idx_concl, is_believable):
+        return self.predict_rating_batch(idx_syl, idx_concl, is_believable) > 3
+
+    @profiling.timed()
+    def predict_rating_batch(self, idx_syl, idx_concl, is_believable):
+        bm = self.get_bel_model(self.optimal_belief_model)
+        return bm.predict_rating_batch(idx_syl, idx_concl, is_believable)
@@ -0,0 +1,190 @@
+""" Opt-in profiling of the models. When enabled (by setting the environment
+variable BELIEF_PROFILE=1 or calling enable), the latency of instrumented
+phases (fitting, scoring, prediction, participants) is recorded in histograms
+and named events (e.g., cache hits and misses) are counted. When disabled,
+instrumented functions only perform a flag check.
+
+The summary of a run can be exported as JSON or CSV (see write_summaries).
+
+"""
+
+import csv
+import functools
+import json
+import math
+import os
+import time
+
+ENV_VAR = 'BELIEF_PROFILE'
+
+# Latency histograms use buckets with upper bounds of 1us * 2^i
+N_BUCKETS = 32
+BUCKET_BASE = 1e-6
+BUCKET_BOUNDS = [BUCKET_BASE * 2**x for x in range(N_BUCKETS)]
+
+_enabled = os.environ.get(ENV_VAR, '') not in ('', '0')
+
+# Recorded data: phase -> [count, total, min, max, histogram], counter -> value
+_phases = {}
+_counters = {}
+
+# Caches with hit/miss statistics (e.g., functools.lru_cache): name -> (cache_info, baseline)
+_caches = {}
+
+def enable():
+    """ Enables profiling for this process and child processes started later. """
+    global _enabled
+    _enabled = True
+    os.environ[ENV_VAR] = '1'
+    reset()
+
+def disable():
+    global _enabled
+    _enabled = False
+    os.environ.pop(ENV_VAR, None)
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    """ Discards the recorded data. Cache statistics are counted from now on. """
+    _phases.clear()
+    _counters.clear()
+    for name, (cache_info, _) in list(_caches.items()):
+        _caches[name] = (cache_info, cache_info())
+
+def register_cache(name, cache_info):
+    """ Registers a cache whose hits and misses are reported in the summary.
+
+    Parameters
+    ----------
+    name : str
+        Name of the cache in the summary.
+
+    cache_info : callable
+        Function returning an object with hits and misses attributes (e.g., the
+        cache_info function of functools.lru_cache).
+
+    """
+    _caches[name] = (cache_info, cache_info())
+
+def record(name, seconds):
+    """ Records a latency of a phase. """
+    stats = _phases.get(name)
+    if stats is None:
+        stats = _phases[name] = [0, 0.0, math.inf, 0.0, [0] * N_BUCKETS]
+
+    stats[0] += 1
+    stats[1] += seconds
+    stats[2] = min(stats[2], seconds)
+    stats[3] = max(stats[3], seconds)
+
+    idx = 0 if seconds <= BUCKET_BASE else min(math.ceil(math.log2(seconds / BUCKET_BASE)), N_BUCKETS - 1)
+    stats[4][idx] += 1
+
+def count(name, value=1):
+    """ Increments a counter. """
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + value
+
+def start():
+    """ Starts measuring a phase spanning several calls (see stop). """
+    return time.perf_counter() if _enabled else None
+
+def stop(name, token):
+    """ Records the time since start (token) as latency of a phase. """
+    if token is not None:
+        record(name, time.perf_counter() - token)
+
+def timed(name=None):
+    """ Decorator recording the latency of each call of a function as phase
+    (named by the qualified function name by default). """
+    def decorator(func):
+        phase_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(phase_name, time.perf_counter() - start_time)
+        return wrapper
+    return decorator
+
+def percentile(histogram, total, q):
+    """ Approximates a percentile by the upper bound of the histogram bucket
+    containing it. """
+    rank = q * total
+    cumulative = 0
+    for bound, value in zip(BUCKET_BOUNDS, histogram):
+        cumulative += value
+        if cumulative >= rank:
+            return bound
+    return BUCKET_BOUNDS[-1]
+
+def summary():
+    """ Summarizes the recorded data.
+
+    Returns
+    -------
+    dict
+        Dictionary with the phase statistics (count, total, mean, min, max and
+        approximate percentiles in seconds, and non-empty histogram buckets
+        keyed by their upper bound) and the counters, including hits and
+        misses of the registered caches.
+
+    """
+    phases = {}
+    for name, (n_calls, total, min_time, max_time, histogram) in sorted(_phases.items()):
+        phases[name] = {
+            'count': n_calls,
+            'total': total,
+            'mean': total / n_calls,
+            'min': min_time,
+            'max': max_time,
+            'p50': percentile(histogram, n_calls, 0.5),
+            'p90': percentile(histogram, n_calls, 0.9),
+            'p99': percentile(histogram, n_calls, 0.99),
+            'histogram': {'{:g}'.format(bound): x for bound, x in zip(BUCKET_BOUNDS, histogram) if x}
+        }
+
+    counters = dict(_counters)
+    for name, (cache_info, baseline) in _caches.items():
+        info = cache_info()
+        counters[name + '.hit'] = counters.get(name + '.hit', 0) + info.hits - baseline.hits
+        counters[name + '.miss'] = counters.get(name + '.miss', 0) + info.misses - baseline.misses
+
+    return {'phases': phases, 'counters': dict(sorted(counters.items()))}
+
+def write_summaries(path, summaries):
+    """ Writes summaries (e.g., one per model of a benchmark run) to a JSON or
+    CSV file (determined by the file extension).
+
+    Parameters
+    ----------
+    path : str
+        Path of the output file (.json or .csv).
+
+    summaries : dict
+        Dictionary mapping names (e.g., models) to summaries (see summary).
+
+    """
+    if not path.endswith('.csv'):
+        with open(path, 'w') as out_file:
+            json.dump(summaries, out_file, indent=2)
+        return
+
+    fields = ['name', 'kind', 'key', 'count', 'total', 'mean', 'min', 'max', 'p50', 'p90', 'p99']
+    with open(path, 'w', newline='') as out_file:
+        writer = csv.DictWriter(out_file, fieldnames=fields)
+        writer.writeheader()
+        for name, summ in summaries.items():
+            for key, stats in summ['phases'].items():
+                row = {x: stats[x] for x in fields[3:]}
+                writer.writerow(dict(row, name=name, kind='phase', key=key))
+            for key, value in summ['counters'].items():
+                writer.writerow({'name': name, 'kind': 'counter', 'key': key, 'count': value})
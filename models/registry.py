@@ -0,0 +1,117 @@
+""" Factory for the syllogistic models used by the belief models and portfolios.
+
+The precomputed tables of the syllogistic models (mReasoner caches, FOL
+verdicts, PHM predictions) are built once per process and shared read-only by
+all instances, which only keep their fitted parameters. Copies (e.g., the deep
+copies made per participant) reload the shared tables instead of duplicating
+them. The registry keeps track of the created instances to report the memory
+and construction time saved by the sharing.
+
+Usage: python registry.py [path/to/evaluation.json]
+
+"""
+
+import json
+import os
+import sys
+import time
+
+import fol
+import mreasoner
+import phm
+
+SYL_MODELS = {
+    "mReasoner": mreasoner.MReasoner,
+    "fol": fol.FOL,
+    "phm": phm.PHM,
+    "phm-continuous": phm.ContinuousPHM
+}
+
+# Construction statistics per method, see create and report
+_stats = {}
+
+def shared_nbytes(model):
+    """ Returns the size of the tables shared by a syllogistic model in bytes. """
+    return sum(getattr(model, x).nbytes for x in model.SHARED_TABLES)
+
+def create(method):
+    """ Creates a syllogistic model using the shared tables.
+
+    Parameters
+    ----------
+    method : str
+        Name of the model (see SYL_MODELS).
+
+    Returns
+    -------
+    object
+        New model instance with its own parameters.
+
+    """
+    if method not in SYL_MODELS:
+        raise ValueError("Unknown method '{}'. Available: {}".format(method, list(SYL_MODELS)))
+
+    start = time.perf_counter()
+    model = SYL_MODELS[method]()
+    elapsed = time.perf_counter() - start
+
+    if method not in _stats:
+        _stats[method] = {'instances': 0, 'first': elapsed, 'rest': 0.0, 'table_bytes': shared_nbytes(model)}
+    else:
+        _stats[method]['rest'] += elapsed
+    _stats[method]['instances'] += 1
+    return model
+
+def report():
+    """ Summarizes the savings of sharing the tables. Without sharing, every
+    instance would build its own tables, taking as long as the first
+    construction and occupying the same amount of memory.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping methods to the number of instances, the size of the
+        shared tables, and the saved memory (bytes) and construction time (s).
+
+    """
+    result = {}
+    for method, stats in _stats.items():
+        n_copies = stats['instances'] - 1
+        result[method] = {
+            'instances': stats['instances'],
+            'table_bytes': stats['table_bytes'],
+            'saved_bytes': n_copies * stats['table_bytes'],
+            'saved_time': max(n_copies * stats['first'] - stats['rest'], 0.0)
+        }
+    return result
+
+if __name__ == "__main__":
+    # The models use the imported module rather than __main__
+    import registry
+    import portfolio
+    import portfolio_belief
+    import SelectiveScrutinyModel as ss
+    import MisinterpretedNecessity as mn
+    import NoBeliefModel as nobel
+
+    models = {
+        'portfolio.py': portfolio.Portfolio,
+        'portfolio_belief.py': portfolio_belief.BeliefPortfolio,
+        'SelectiveScrutinyModel.py': ss.SelectiveScrutinyRestr,
+        'MisinterpretedNecessity.py': mn.MisinterpretedNecessityRestr,
+        'NoBeliefModel.py': nobel.NoBeliefModel
+    }
+
+    # Construct the models of a benchmark
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join('..', 'benchmark', 'evaluation.json')
+    with open(path) as bench_file:
+        benchmark = json.load(bench_file)
+    for entry in benchmark['models']:
+        if isinstance(entry, dict) and os.path.basename(entry['filename']) in models:
+            models[os.path.basename(entry['filename'])](**entry.get('args', {}))
+
+    print('{:<16} {:>10} {:>14} {:>14} {:>12}'.format('method', 'instances', 'tables [KiB]', 'saved [KiB]', 'saved [ms]'))
+    for method, stats in registry.report().items():
+        print('{:<16} {:>10} {:>14.1f} {:>14.1f} {:>12.2f}'.format(
+            method, stats['instances'], stats['table_bytes'] / 1024,
+            stats['saved_bytes'] / 1024, stats['saved_time'] * 1000))